@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Time and measure peak memory of the wana pipeline on synthetic histories.
+
+Drive is replaced by local CSV storage in a temporary directory, so runs are offline and
+repeatable. Each operation is timed `--repeat` times (median reported) and run once more
+under tracemalloc for its peak Python allocation.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import pandas as pd
+
+from benchmarks.synthetic import generate
+from utils import render_cache
+from utils.storage import LocalCSVStorage
+from utils.weight_analysis import wana
+
+DEFAULT_YEARS = [1, 5, 10, 25, 50]
+
+
+def operations(raw_df: pd.DataFrame, storage) -> dict:
+    """name -> (setup, op). `setup()` builds fresh state outside the timed region."""
+    def fresh():
+        return wana("bench", raw_df, storage=storage)
+
+    def next_day(analysis):
+        return (analysis.store.last_date + pd.Timedelta(days=1)).date()
+
+    def fresh_file():
+        # Undo the previous repetition's append, or the next one times the duplicate-date rejection.
+        raw_df.to_csv(storage.path, index=False)
+        return fresh()
+
+    def update(analysis):
+        date = next_day(analysis)
+        result = analysis.update_data(date, 160.0, 5, True)
+        if result != "Table Updated":
+            raise RuntimeError(f"update_data did not append: {result}")
+
+    def uncached(draw):
+        def op(analysis):
+            render_cache.clear()
+            draw(analysis)
+        return op
+
+    return {
+        "init": (lambda: None, lambda _: fresh()),
+        "find_missing": (fresh, lambda a: a.find_missing()),
+        "last_n": (fresh, lambda a: a.last_n(100)),
+        "plot": (fresh, uncached(lambda a: a.plot_image())),
+        "forecast_graph": (fresh, uncached(lambda a: a.forecast_image(4))),
+        "update_data": (fresh_file, update),
+    }
+
+
+def measure(setup, op, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        op(state)
+        timings.append(time.perf_counter() - start)
+    state = setup()
+    tracemalloc.start()
+    op(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_ms": statistics.median(timings) * 1000, "min_ms": min(timings) * 1000, "peak_kb": peak / 1024}
+
+
+def run(years_list: list[float], users: int, repeat: int, only: list[str] | None) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in years_list:
+            for user in range(users):
+                raw_df = generate(years, seed=user)
+                path = os.path.join(tmp, f"weight_{years}_{user}.csv")
+                raw_df.to_csv(path, index=False)
+                storage = LocalCSVStorage(path)
+                for name, (setup, op) in operations(raw_df, storage).items():
+                    if only and name not in only:
+                        continue
+                    stats = measure(setup, op, repeat)
+                    # update_data appends to the file; restore it so every user/op starts equal.
+                    raw_df.to_csv(path, index=False)
+                    results.append({"op": name, "years": years, "user": user, "rows": len(raw_df), **stats})
+    return results
+
+
+def summarise(results: list[dict]) -> list[dict]:
+    """Median over users for each (op, years)."""
+    groups = {}
+    for r in results:
+        groups.setdefault((r["op"], r["years"]), []).append(r)
+    return [{"op": op, "years": years, "rows": rows[0]["rows"],
+             "median_ms": statistics.median(r["median_ms"] for r in rows),
+             "peak_kb": max(r["peak_kb"] for r in rows)}
+            for (op, years), rows in groups.items()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the wana pipeline on synthetic histories.")
+    parser.add_argument("--years", type=float, nargs="+", default=DEFAULT_YEARS, help="History lengths to test")
+    parser.add_argument("--users", type=int, default=1, help="Synthetic users (logs) per history length")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per operation")
+    parser.add_argument("--only", nargs="+", help="Only run these operations")
+    parser.add_argument("--json", help="Also write raw results to this file")
+    args = parser.parse_args()
+
+    results = run(args.years, args.users, args.repeat, args.only)
+    print(f"{'operation':<16}{'years':>7}{'rows':>8}{'median ms':>12}{'peak KiB':>12}")
+    for r in summarise(results):
+        print(f"{r['op']:<16}{r['years']:>7g}{r['rows']:>8}{r['median_ms']:>12.2f}{r['peak_kb']:>12.0f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
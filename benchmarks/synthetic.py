@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Generate synthetic weight logs in the data/weight.csv schema for benchmarking."""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.feature_store import LBS_TO_KGS
+
+
+def generate(years: float, seed: int = 0, missing: float = 0.02, end=None) -> pd.DataFrame:
+    """
+    A daily log covering `years` up to `end` (default today), with a `missing` share of days
+    dropped. Weight drifts with the food score and exercise the same way the forecast
+    regression assumes, plus day-to-day noise.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or pd.Timestamp.today().normalize())
+    dates = pd.date_range(end=end, periods=int(round(years * 365.25)), freq="D")
+    n = len(dates)
+    food = np.clip(np.round(rng.normal(5, 1.5, n)), 1, 10).astype(int)
+    exer = (rng.random(n) < 0.5).astype(int)
+    drift = 0.06 * (food - 5) / 5 - 0.05 * exer
+    trend = 165 + np.cumsum(drift + rng.normal(0, 0.05, n))
+    weight = np.round(trend + rng.normal(0, 0.6, n), 1)
+    df = pd.DataFrame({"date": dates.strftime("%Y-%m-%d"), "weight_lbs": weight, "exer": exer,
+                       "food": food, "weight_kgs": weight * LBS_TO_KGS})
+    keep = rng.random(n) >= missing
+    keep[-1] = True
+    return df[keep].reset_index(drop=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Write synthetic weight logs.")
+    parser.add_argument("years", type=float, help="Years of history per log")
+    parser.add_argument("--users", type=int, default=1, help="Number of logs to write")
+    parser.add_argument("--missing", type=float, default=0.02, help="Share of days left out")
+    parser.add_argument("--out", default="synthetic", help="Output directory")
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    for user in range(args.users):
+        df = generate(args.years, seed=user, missing=args.missing)
+        path = out / f"weight_{user}.csv"
+        df.to_csv(path, index=False)
+        print(f"{path}: {len(df)} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
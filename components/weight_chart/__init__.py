@@ -0,0 +1,58 @@
+import streamlit.components.v1 as components
+import streamlit as st
+import numpy as np
+import os
+
+_COMPONENT_DIR = os.path.join(os.path.dirname(__file__), "frontend")
+_weight_chart = components.declare_component("weight_chart", path=_COMPONENT_DIR)
+
+
+def series_payload(store, start=0):
+    """
+    Logged rows `start:` as compact columns: first day, day gaps, weight (lbs), food, exercise.
+    Days filled in by imputation are left out, and `start` counts logged rows only.
+    """
+    rows = np.flatnonzero(~store.imputed())[start:]
+    days = store.days()[rows]
+    return {
+        "day0": int(days[0]) if len(days) else None,
+        "gaps": np.diff(days).tolist(),
+        "weight": np.round(store.values("weight_lbs")[rows], 2).tolist(),
+        "food": store.values("food")[rows].tolist(),
+        "exer": store.values("exer")[rows].astype("int8").tolist(),
+    }
+
+
+def forecast_payload(fc, unit):
+    """Every scenario path of a `Forecast`, daily up to its full horizon, in `unit`."""
+    return {
+        "unit": unit,
+        "day0": int(fc.start.value // 86_400_000_000_000),
+        "labels": fc.labels,
+        "values": np.round(fc.values, 2).tolist(),
+    }
+
+
+def weight_chart(store, forecast=None, forecast_unit="lbs", forecast_key=None, unit="lbs", weeks=2,
+                 goals=None, key="weight_chart", height=460):
+    """
+    Interactive weight chart drawn in the browser.
+
+    The log is sent once; later reruns send only the rows appended since, and the forecast
+    only when `forecast_key` changes. Zoom, pan, unit and forecast weeks are handled by the
+    frontend without a rerun. If the frontend's copy does not line up with what was sent
+    (e.g. the iframe was reloaded) it asks for a resync and gets the full log again.
+    """
+    sent = st.session_state.setdefault(f"_{key}_sent", {})
+    value = st.session_state.get(key) or {}
+    n = int(np.count_nonzero(~store.imputed()))
+    full = (sent.get("generation") != store.generation or n < sent.get("n", 0)
+            or value.get("resync") not in (None, sent.get("resync")))
+    start = 0 if full else sent["n"]
+    data = {"generation": store.generation, "from": start, "reset": full, **series_payload(store, start)}
+    fc = None
+    if forecast is not None and (full or sent.get("forecast") != forecast_key):
+        fc = forecast_payload(forecast, forecast_unit)
+    sent.update(generation=store.generation, n=n, forecast=forecast_key, resync=value.get("resync"))
+    return _weight_chart(data=data, forecast=fc, unit=unit, weeks=weeks, goals=goals,
+                         key=key, height=height, default=None)
@@ -1,12 +1,13 @@
 import numpy as np
 import pandas as pd
-from statsmodels.tsa.arima.model import ARIMA
-import matplotlib.pyplot as plt
-from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
-from statsmodels.tsa.stattools import adfuller, kpss
 import warnings
 
+# matplotlib and statsmodels are imported inside the functions that use them so that
+# importing this module stays cheap for callers that only need part of it.
+
 def all_ac(Y, lags=15):
+    import matplotlib.pyplot as plt
+    from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
     fig, ax = plt.subplots(1, 2, figsize=(16, 5))
     plot_acf(Y, zero=False, ax=ax[0], lags=lags)
     ax[0].set_title('ACF')
@@ -15,6 +16,7 @@ def all_ac(Y, lags=15):
     plt.show()
 
 def plot_forecast(original, prediction):
+    import matplotlib.pyplot as plt
     plt.plot(original, label='Actual', linestyle='-')
     plt.plot(prediction, label='Prediction', linestyle='--')
     plt.xlabel('Date')
@@ -24,6 +26,7 @@ def plot_forecast(original, prediction):
     plt.show()
 
 def stationarity_test(s):
+    from statsmodels.tsa.stattools import adfuller, kpss
     warnings.simplefilter("ignore", category=UserWarning)
     kps = kpss(s)
     adf = adfuller(s)
@@ -37,6 +40,7 @@ def stationarity_test(s):
     return (kpssh, adfh)
 
 def diagnostic(model, lags=15):
+    import matplotlib.pyplot as plt
     print(model.summary())
     model.plot_diagnostics()
     plt.show()
@@ -46,6 +50,7 @@ def diagnostic(model, lags=15):
     plt.show()
 
 def compare_predictions(actual, prediction_list, model_list):
+    import matplotlib.pyplot as plt
     plt.plot(actual, label='Actual', linestyle='-')
     colors = ['blue', 'green', 'red', 'cyan', 'magenta', 'yellow', 'black']
     for i, (p, m) in enumerate(zip(prediction_list, model_list)):
@@ -57,6 +62,7 @@ def compare_predictions(actual, prediction_list, model_list):
     plt.show()
 
 def cross_correl(y,x, max_lags = 24, titulo = 'Cross Correlation'):
+    import matplotlib.pyplot as plt
     correl = []
     lags = range(-max_lags, max_lags + 1)
     for l in lags:
@@ -71,9 +77,30 @@ def cross_correl(y,x, max_lags = 24, titulo = 'Cross Correlation'):
     plt.axhline(conf_interval, color='k', ls='--')
     plt.show()
     
+def model_stats(model):
+    return {'rmse': float(np.sqrt(np.mean(model.resid**2))), 'aic': float(model.aic), 'bic': float(model.bic)}
+
 def compare_stats(model_list, model_list_names):
     for m,n in zip(model_list, model_list_names):
-        rmse = round(np.sqrt(np.mean(m.resid**2)))
-        bic = round(m.bic)
-        aic = round(m.aic)
-        print(f'BIC = {bic} -- AIC = {aic} --  RMSE = {rmse} - {n}')
\ No newline at end of file
+        stats = model_stats(m)
+        rmse = round(stats['rmse'])
+        bic = round(stats['bic'])
+        aic = round(stats['aic'])
+        print(f'BIC = {bic} -- AIC = {aic} --  RMSE = {rmse} - {n}')
+
+def rmse(actual, prediction):
+    actual, prediction = np.asarray(actual, dtype=float), np.asarray(prediction, dtype=float)
+    return float(np.sqrt(np.nanmean((actual - prediction)**2)))
+
+def rolling_origins(n, folds, horizon, min_train):
+    # Forecast origins for a rolling-origin backtest: the last `folds` cut points, `horizon` apart,
+    # each leaving at least `min_train` observations to fit on and `horizon` to score against.
+    origins = [n - horizon * k for k in range(folds, 0, -1)]
+    return [o for o in origins if o >= min_train]
+
+def fit_arima(y, x, order, start_params=None):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    warnings.simplefilter("ignore")
+    model = SARIMAX(y, exog=x, order=order).fit(start_params=start_params, disp=False)
+    warnings.simplefilter("default")
+    return model
\ No newline at end of file
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Backtest a grid of forecast models in parallel and write the winning parameter files."""
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(ROOT))
+
+import functions as sf
+from utils.feature_store import FeatureStore
+from utils.forecast import score, weekly_gain
+from utils.storage import DEFAULT_SOURCE, open_storage
+
+# ARIMA fits need a reasonable run of history before the first backtest origin.
+ARIMA_MIN_TRAIN = 60
+REGRESSION_MIN_TRAIN = 8
+# Production scores the last 7 days' food mean and exercise count, so only 7-day fits are written.
+# Other windows have smoother targets and fewer rows; they are ranked separately, for comparison.
+PRODUCTION_WINDOW = 7
+
+
+def load_features(source: str) -> pd.DataFrame:
+    return FeatureStore(open_storage(source).read(stale_ok=False)).frame()
+
+
+# ── Regression: weekly weight change on a weighted food/exercise score ─────────────────
+
+def window_table(df: pd.DataFrame, window: int) -> pd.DataFrame:
+    """Per-window food mean, exercise count and weight change, expressed per 7 days."""
+    rule = "W" if window == 7 else f"{window}D"
+    table = df.resample(rule).agg({"weight_lbs_avg_7d": "last", "exer": "sum", "food": "mean"})
+    per_week = 7 / window
+    table["exer"] = table["exer"] * per_week
+    table["y"] = table["weight_lbs_avg_7d"].diff() * per_week
+    table = table.dropna()
+    return table[table["exer"] < 7]
+
+
+def fit_regression(table: pd.DataFrame, w1: float) -> dict:
+    food_min, food_range = table["food"].min(), np.ptp(table["food"]) or 1.0
+    exer_min, exer_range = table["exer"].min(), np.ptp(table["exer"]) or 1.0
+    param = {"food_min": float(food_min), "food_range": float(food_range),
+             "exer_min": float(exer_min), "exer_range": float(exer_range), "w1": float(w1)}
+    x = score(param, table["food"], table["exer"])
+    slope, intercept = np.polyfit(x, table["y"], 1)
+    return {"slope": float(slope), "intercept": float(intercept), **param}
+
+
+def backtest_regression(task: dict) -> dict:
+    table, w1, window = task["table"], task["w1"], task["window"]
+    actual, predicted = [], []
+    for origin in sf.rolling_origins(len(table), task["folds"], 1, REGRESSION_MIN_TRAIN):
+        param = fit_regression(table.iloc[:origin], w1)
+        row = table.iloc[origin]
+        actual.append(row["y"])
+        predicted.append(weekly_gain(param, score(param, row["food"], row["exer"])))
+    param = fit_regression(table, w1)
+    resid = table["y"] - weekly_gain(param, score(param, table["food"], table["exer"]))
+    n, k = len(table), 2
+    ll_term = n * np.log(np.mean(resid**2))
+    return {"family": "regression", "window": window, "name": f"w1={w1:.2f} window={window}d",
+            "rmse": sf.rmse(actual, predicted), "aic": float(ll_term + 2 * k), "bic": float(ll_term + k * np.log(n)),
+            "params": param}
+
+
+# ── ARIMA: daily weight with the food/exercise average as exogenous input ────────────────
+
+def backtest_arima(task: dict) -> dict:
+    y, x, order, horizon = task["y"], task["x"], task["order"], task["horizon"]
+    name = f"SARIMAX{order}"
+    try:
+        errors = []
+        for origin in sf.rolling_origins(len(y), task["folds"], horizon, ARIMA_MIN_TRAIN):
+            model = sf.fit_arima(y.iloc[:origin], x.iloc[:origin], order)
+            future_x = np.full((horizon, 1), x.iloc[origin - 1, 0])
+            prediction = model.get_forecast(steps=horizon, exog=future_x).predicted_mean
+            errors.append(sf.rmse(y.iloc[origin:origin + horizon], prediction))
+        model = sf.fit_arima(y, x, order)
+    except Exception as e:
+        return {"family": "arima", "name": name, "rmse": np.inf, "aic": np.inf, "bic": np.inf,
+                "error": type(e).__name__}
+    stats = sf.model_stats(model)
+    return {"family": "arima", "name": name,
+            "rmse": float(np.sqrt(np.mean(np.square(errors)))), "aic": stats["aic"], "bic": stats["bic"],
+            "params": {"params": dict(zip(model.model.param_names, map(float, model.params))),
+                       "order": list(order),
+                       "exog_mean": float(x.iloc[:, 0].mean()), "exog_std": float(x.iloc[:, 0].std())}}
+
+
+def parse_orders(text: str) -> list[tuple[int, int, int]]:
+    return [tuple(int(v) for v in item.split(",")) for item in text.split(";") if item]
+
+
+def build_tasks(df: pd.DataFrame, args) -> list[tuple]:
+    tasks = []
+    if args.only in (None, "regression"):
+        for window in args.windows:
+            table = window_table(df, window)
+            for w1 in np.round(np.arange(0, 1 + 1e-9, args.w1_step), 4):
+                tasks.append((backtest_regression, {"table": table, "w1": w1, "window": window, "folds": args.folds}))
+    if args.only in (None, "arima"):
+        data = df[["weight_lbs", "food_exercise_avg_7d"]].dropna().reset_index(drop=True)
+        y, x = data["weight_lbs"], data[["food_exercise_avg_7d"]]
+        for order in args.orders:
+            tasks.append((backtest_arima, {"y": y, "x": x, "order": order, "folds": args.folds, "horizon": args.horizon}))
+    return tasks
+
+
+def _run(task):
+    fn, kwargs = task
+    return fn(kwargs)
+
+
+def groups(results: list[dict]) -> dict:
+    """Candidates that can be ranked against each other: ARIMA orders, and regressions per window."""
+    out = {}
+    for r in sorted(results, key=lambda r: (r["family"] != "regression", r.get("window", 0))):
+        out.setdefault((r["family"], r.get("window")), []).append(r)
+    return out
+
+
+def report(results: list[dict], rank: str, top: int) -> None:
+    for (family, window), rows in groups(results).items():
+        rows = sorted(rows, key=lambda r: r[rank])
+        title = f"{family}, {window}-day window" if window else family
+        print(f"\n{title} (ranked by {rank}, {len(rows)} candidates)")
+        print(f"{'candidate':<28}{'rmse':>10}{'aic':>12}{'bic':>12}")
+        for r in rows[:top]:
+            note = f"  {r['error']}" if "error" in r else ""
+            print(f"{r['name']:<28}{r['rmse']:>10.4f}{r['aic']:>12.2f}{r['bic']:>12.2f}{note}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rolling-origin backtests over ARIMA orders and regression weights.")
+    parser.add_argument("--storage", default=DEFAULT_SOURCE,
+                        help="Drive file id, csv://path or sqlite://path (default: $WEIGHT_STORAGE or the Drive log)")
+    parser.add_argument("--only", choices=["arima", "regression"], help="Tune a single model family")
+    parser.add_argument("--orders", type=parse_orders,
+                        default=[(p, 1, q) for p, q in itertools.product(range(3), range(3))],
+                        help='ARIMA orders as "p,d,q;p,d,q" (default: p,q in 0..2 with d=1)')
+    parser.add_argument("--w1-step", type=float, default=0.05, help="Grid step for the exercise weight w1")
+    parser.add_argument("--windows", type=int, nargs="+", default=[7, 14],
+                        help=f"Aggregation windows in days; each is ranked on its own and only {PRODUCTION_WINDOW} is written")
+    parser.add_argument("--folds", type=int, default=8, help="Backtest origins per candidate")
+    parser.add_argument("--horizon", type=int, default=14, help="ARIMA forecast horizon in days")
+    parser.add_argument("--rank", choices=["rmse", "aic", "bic"], default="rmse")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--top", type=int, default=10, help="Candidates to list per family")
+    parser.add_argument("--out-reg", default=str(HERE / "model_parameters_reg.json"))
+    parser.add_argument("--out-arima", default=str(HERE / "model_parameters_arima.json"))
+    parser.add_argument("--no-write", action="store_true", help="Only print the ranking")
+    args = parser.parse_args()
+
+    df = load_features(args.storage)
+    tasks = build_tasks(df, args)
+    print(f"Backtesting {len(tasks)} candidates on {len(df)} days with {args.jobs} workers…")
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(_run, tasks))
+    report(results, args.rank, args.top)
+
+    if args.no_write:
+        return 0
+    for family, path in (("regression", args.out_reg), ("arima", args.out_arima)):
+        valid = [r for r in groups(results).get((family, PRODUCTION_WINDOW if family == "regression" else None), [])
+                 if "error" not in r]
+        if not valid:
+            continue
+        best = min(valid, key=lambda r: r[args.rank])
+        with open(path, "w") as f:
+            json.dump(best["params"], f)
+        print(f"\nWrote {best['name']} to {path}")
+    print("Production reads model_parameters_reg_prod.json; copy the regression file there to promote it.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
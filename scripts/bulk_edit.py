@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Apply many inserts, updates and deletes to the weight log in one write.
+
+Changes come from files (log-format CSVs or scale/fitness-tracker exports) and from dates
+or date ranges on the command line. They are parsed, validated and deduplicated as whole
+columns, diffed against the stored log, and committed with a single upload. `--dry-run`
+only prints the diff.
+
+  bulk_edit.py --import withings.csv --unit kgs --default-food 5 --default-exer 0 --dry-run
+  bulk_edit.py --delete-range 2025-03-01 2025-03-07 --import fixed_week.csv --replace
+  bulk_edit.py --set food=6 --range 2025-02-10 2025-02-16
+"""
+import argparse
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.feature_store import LBS_TO_KGS
+from utils.storage import COLUMNS, DEFAULT_SOURCE, open_storage
+
+FIELDS = ["weight_lbs", "exer", "food"]
+WEIGHT_RANGE = (50.0, 700.0)
+FOOD_RANGE = (1, 10)
+_NUMBER = r"([-+]?\d*\.?\d+)"
+
+
+# ── Reading ──────────────────────────────────────────────────────────────────────
+
+def normalise_log(df: pd.DataFrame) -> pd.DataFrame:
+    """The stored log indexed by day, with just the logged fields (as floats, like the imports)."""
+    out = pd.DataFrame({field: df[field].astype("float64").to_numpy() for field in FIELDS},
+                       index=pd.DatetimeIndex(pd.to_datetime(df["date"]).dt.normalize(), name="date"))
+    return out.sort_index()
+
+
+def _find_column(columns, *needles, exclude=()) -> str | None:
+    for col in columns:
+        name = col.lower()
+        if any(n in name for n in needles) and not any(e in name for e in exclude):
+            return col
+    return None
+
+
+def _weight_unit(column: str, default: str | None) -> str | None:
+    name = column.lower()
+    if re.search(r"kg", name):
+        return "kgs"
+    if re.search(r"lb|pound", name):
+        return "lbs"
+    return default
+
+
+def read_changes(path: str, unit: str | None = None, date_col: str | None = None,
+                 weight_col: str | None = None, keep: str = "first") -> tuple[pd.DataFrame | None, list[str]]:
+    """
+    Rows from a log-format CSV or a scale/tracker export, one per day, as `weight_lbs`,
+    `exer` and `food` (NaN where the file has no such column). Columns are matched by
+    name (`date`/`time`, `weight`, `food`, `exer`/`exercise`); a weight column named
+    with kg or lb sets the unit, otherwise `unit` must. Several readings on one day are
+    reduced with `keep` (first, last or mean, in file order).
+
+    Returns the rows and notes about skipped lines, or None and the reason the file
+    can't be used.
+    """
+    raw, error = read_table(path)
+    if raw is None:
+        return None, [error]
+    date_col = date_col or ("date" if "date" in raw.columns else _find_column(raw.columns, "date", "time"))
+    weight_col = weight_col or next((c for c in ("weight_lbs", "weight_kgs") if c in raw.columns), None) \
+        or _find_column(raw.columns, "weight", exclude=("bmi", "fat", "goal"))
+    if date_col is None or weight_col is None:
+        return None, [f"{path}: need a date and a weight column, found {list(raw.columns)}"]
+    weight_unit = _weight_unit(weight_col, unit)
+    if weight_unit is None:
+        return None, [f"{path}: can't tell the unit of '{weight_col}'; pass --unit"]
+
+    stamps = pd.to_datetime(raw[date_col], errors="coerce", format="mixed")
+    if isinstance(stamps.dtype, pd.DatetimeTZDtype):
+        stamps = stamps.dt.tz_localize(None)
+    weight = pd.to_numeric(raw[weight_col].astype(str).str.extract(_NUMBER)[0], errors="coerce")
+    if weight_unit == "kgs":
+        weight = weight / LBS_TO_KGS
+    food_col = _find_column(raw.columns, "food")
+    exer_col = _find_column(raw.columns, "exer")
+    rows = pd.DataFrame({
+        "date": stamps.dt.normalize(),
+        "weight_lbs": weight,
+        "exer": _flags(raw[exer_col]) if exer_col else np.nan,
+        "food": pd.to_numeric(raw[food_col], errors="coerce") if food_col else np.nan,
+    })
+    bad = rows["date"].isna() | rows["weight_lbs"].isna()
+    # Exports often carry rows without a weight (e.g. body-fat-only readings); skip them, but say so.
+    notes = [f"{path}: skipped {bad.sum()} row(s) without a readable date and weight (lines "
+             + ", ".join(str(i + 2) for i in np.flatnonzero(bad)[:10]) + ")"] if bad.any() else []
+    rows = rows[~bad]
+    how = {"first": "first", "last": "last", "mean": "mean"}[keep]
+    rows = rows.groupby("date", sort=True).agg({"weight_lbs": how, "exer": "last", "food": "last"})
+    rows["weight_lbs"] = rows["weight_lbs"].round(2)
+    return rows, notes
+
+
+def _flags(col: pd.Series) -> pd.Series:
+    text = col.astype(str).str.strip().str.lower()
+    return pd.Series(np.select([text.isin(["1", "true", "yes", "y"]), text.isin(["0", "false", "no", "n"])],
+                               [1.0, 0.0], np.nan), index=col.index)
+
+
+def read_table(path: str) -> tuple[pd.DataFrame | None, str | None]:
+    """The CSV at `path`, or None and why it can't be read."""
+    try:
+        return pd.read_csv(path), None
+    except (OSError, UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        return None, f"{path}: can't read it ({type(e).__name__}: {e})"
+
+
+def parse_dates(values: list[str]) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(pd.to_datetime(values)).normalize()
+
+
+def date_span(ranges: list[list[str]]) -> pd.DatetimeIndex:
+    for start, end in map(parse_dates, ranges):
+        if start > end:
+            raise ValueError(f"range {start.date()} {end.date()} ends before it starts")
+    spans = [pd.date_range(*parse_dates(r)) for r in ranges]
+    return spans[0].append(spans[1:]).unique() if spans else pd.DatetimeIndex([])
+
+
+# ── Applying ─────────────────────────────────────────────────────────────────────
+
+def apply_changes(log: pd.DataFrame, imports: pd.DataFrame, replace: bool, defaults: dict,
+                  updates: dict, update_dates: pd.DatetimeIndex, deletes: pd.DatetimeIndex) -> tuple[pd.DataFrame, list[str]]:
+    """The new log plus notes/errors. Imports go first, then `updates` on `update_dates`, then deletes."""
+    notes = []
+    new = log.copy()
+    if len(imports):
+        existing = imports.index.isin(new.index)
+        if not replace and existing.any():
+            notes.append(f"skipped {existing.sum()} imported date(s) already in the log (use --replace)")
+            imports = imports[~existing]
+        # Fields missing from the file keep their stored value, or take the default on new days.
+        filled = imports.combine_first(new.reindex(imports.index)) if replace else imports.copy()
+        for field, value in defaults.items():
+            if value is not None:
+                filled[field] = filled[field].fillna(value)
+        new = pd.concat([new[~new.index.isin(filled.index)], filled[FIELDS]]).sort_index()
+    if updates:
+        missing = update_dates.difference(new.index)
+        if len(missing):
+            notes.append(f"skipped --set on {len(missing)} date(s) not in the log")
+        target = update_dates.intersection(new.index)
+        for field, value in updates.items():
+            new.loc[target, field] = value
+    if len(deletes):
+        missing = deletes.difference(new.index)
+        if len(missing):
+            notes.append(f"{len(missing)} date(s) to delete were not in the log")
+        new = new[~new.index.isin(deletes)]
+    return new, notes
+
+
+def validate(df: pd.DataFrame) -> list[str]:
+    """Every rule checked as a column mask, so large imports validate in one pass."""
+    today = pd.Timestamp.today().normalize()
+    rules = {
+        "food or exercise missing (pass --default-food/--default-exer)": df[["food", "exer"]].isna().any(axis=1),
+        f"weight outside {WEIGHT_RANGE[0]:g}-{WEIGHT_RANGE[1]:g} lbs": ~df["weight_lbs"].between(*WEIGHT_RANGE),
+        f"food not a whole number {FOOD_RANGE[0]}-{FOOD_RANGE[1]}":
+            df["food"].notna() & (~df["food"].between(*FOOD_RANGE) | (df["food"] % 1 != 0)),
+        "exercise not 0 or 1": df["exer"].notna() & ~df["exer"].isin([0, 1]),
+        "date in the future": pd.Series(df.index > today, index=df.index),
+    }
+    errors = []
+    for message, mask in rules.items():
+        dates = df.index[mask.to_numpy()]
+        if len(dates):
+            shown = ", ".join(d.strftime("%Y-%m-%d") for d in dates[:5])
+            errors.append(f"{message}: {shown}{' …' if len(dates) > 5 else ''} ({len(dates)} row(s))")
+    return errors
+
+
+def diff(old: pd.DataFrame, new: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """(added, removed, changed) rows; `changed` has `<field>_old`/`<field>_new` columns."""
+    added = new[~new.index.isin(old.index)]
+    removed = old[~old.index.isin(new.index)]
+    common = new.index.intersection(old.index)
+    a, b = old.loc[common, FIELDS], new.loc[common, FIELDS]
+    differs = (~np.isclose(a.to_numpy(dtype="float64"), b.to_numpy(dtype="float64"))).any(axis=1)
+    changed = a[differs].join(b[differs], lsuffix="_old", rsuffix="_new")
+    return added, removed, changed
+
+
+def _row(r) -> str:
+    return f"weight {r.weight_lbs:6.1f}  food {int(r.food):2d}  exer {int(r.exer)}"
+
+
+def print_diff(added, removed, changed, limit: int) -> None:
+    lines = [(d, f"+ {d:%Y-%m-%d}  {_row(r)}") for d, r in zip(added.index, added.itertuples())]
+    lines += [(d, f"- {d:%Y-%m-%d}  {_row(r)}") for d, r in zip(removed.index, removed.itertuples())]
+    for d, r in changed.iterrows():
+        parts = [f"{f} {r[f + '_old']:g} → {r[f + '_new']:g}" for f in FIELDS if not np.isclose(r[f + "_old"], r[f + "_new"])]
+        lines.append((d, f"~ {d:%Y-%m-%d}  " + "  ".join(parts)))
+    lines.sort(key=lambda item: item[0])
+    for _, line in lines[:limit]:
+        print(line)
+    if len(lines) > limit:
+        print(f"… {len(lines) - limit} more (use --limit)")
+    print(f"\n{len(added)} added, {len(changed)} changed, {len(removed)} deleted")
+
+
+def to_storage(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame({"date": df.index.strftime("%Y-%m-%d"), "weight_lbs": df["weight_lbs"].to_numpy(),
+                        "exer": df["exer"].astype("int64").to_numpy(), "food": df["food"].astype("int64").to_numpy()})
+    out["weight_kgs"] = out["weight_lbs"] * LBS_TO_KGS
+    return out[COLUMNS]
+
+
+# ── CLI ──────────────────────────────────────────────────────────────────────────
+
+def parse_set(items: list[str]) -> dict:
+    updates = {}
+    aliases = {"weight": "weight_lbs", "exercise": "exer"}
+    for item in items:
+        field, _, value = item.partition("=")
+        field = aliases.get(field.strip(), field.strip())
+        if field not in FIELDS or not value:
+            raise ValueError(f"--set expects weight=, food= or exer=, got '{item}'")
+        updates[field] = float(value)
+    return updates
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bulk import, update and delete entries in the weight log with one write.")
+    parser.add_argument("--storage", default=DEFAULT_SOURCE,
+                        help="Drive file id, csv://path or sqlite://path (default: $WEIGHT_STORAGE or the Drive log)")
+    parser.add_argument("--import", dest="imports", action="append", default=[], metavar="FILE",
+                        help="Log-format CSV or scale/tracker export to insert (repeatable)")
+    parser.add_argument("--replace", action="store_true", help="Imported dates overwrite existing entries")
+    parser.add_argument("--unit", choices=["lbs", "kgs"], help="Weight unit when the column name doesn't say")
+    parser.add_argument("--date-col", help="Date column in the imported files")
+    parser.add_argument("--weight-col", help="Weight column in the imported files")
+    parser.add_argument("--keep", choices=["first", "last", "mean"], default="first",
+                        help="Which of several readings on one day to keep (default: first)")
+    parser.add_argument("--default-food", type=int, help="Food score for imported days that have none")
+    parser.add_argument("--default-exer", type=int, choices=[0, 1], help="Exercise flag for imported days that have none")
+    parser.add_argument("--set", dest="sets", action="append", default=[], metavar="FIELD=VALUE",
+                        help="Set weight, food or exer on the --on/--range dates (repeatable)")
+    parser.add_argument("--on", nargs="+", default=[], metavar="DATE", help="Dates for --set")
+    parser.add_argument("--range", nargs=2, action="append", default=[], metavar=("START", "END"), help="Date range for --set")
+    parser.add_argument("--delete", nargs="+", default=[], metavar="DATE", help="Dates to delete")
+    parser.add_argument("--delete-range", nargs=2, action="append", default=[], metavar=("START", "END"),
+                        help="Inclusive date range to delete (repeatable)")
+    parser.add_argument("--delete-file", action="append", default=[], metavar="FILE", help="CSV whose dates are deleted")
+    parser.add_argument("--dry-run", action="store_true", help="Print the diff without writing")
+    parser.add_argument("--yes", "-y", action="store_true", help="Don't ask for confirmation")
+    parser.add_argument("--limit", type=int, default=50, help="Diff lines to print")
+    args = parser.parse_args()
+
+    errors, notes, parts = [], [], []
+    try:
+        updates = parse_set(args.sets)
+        update_dates = parse_dates(args.on).append(date_span(args.range)).unique()
+        deletes = parse_dates(args.delete).append(date_span(args.delete_range))
+        for path in args.delete_file:
+            frame, error = read_table(path)
+            if frame is None:
+                errors.append(error)
+                continue
+            deletes = deletes.append(parse_dates(frame[args.date_col or _find_column(frame.columns, "date", "time")]))
+        deletes = deletes.unique()
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Invalid arguments: {e}", file=sys.stderr)
+        return 2
+    if updates and not len(update_dates):
+        print("--set needs --on or --range.", file=sys.stderr)
+        return 2
+
+    for path in args.imports:
+        rows, messages = read_changes(path, args.unit, args.date_col, args.weight_col, args.keep)
+        if rows is None:
+            errors += messages
+        else:
+            notes += messages
+            parts.append(rows)
+    imports = pd.concat(parts) if parts else pd.DataFrame(columns=FIELDS, index=pd.DatetimeIndex([], name="date"))
+    # Across files the last file wins for a repeated date.
+    imports = imports[~imports.index.duplicated(keep="last")].sort_index()
+
+    storage = open_storage(args.storage)
+    old = normalise_log(storage.read(stale_ok=False))
+    new, apply_notes = apply_changes(old, imports, args.replace, {"food": args.default_food, "exer": args.default_exer},
+                               updates, update_dates, deletes)
+    notes += apply_notes
+    added, removed, changed = diff(old, new)
+    # Only rows this run adds or changes are checked; old entries are not this run's problem.
+    errors += validate(new.loc[added.index.union(changed.index)])
+    for note in notes:
+        print(f"note: {note}")
+    if errors:
+        print("Nothing written; fix these first:", file=sys.stderr)
+        for error in errors:
+            print(f"  {error}", file=sys.stderr)
+        return 1
+
+    print_diff(added, removed, changed, args.limit)
+    if not (len(added) or len(removed) or len(changed)):
+        return 0
+    if args.dry_run:
+        print("Dry run: nothing written.")
+        return 0
+    if not args.yes and input("\nWrite these changes? [y/N] ").strip().lower() != "y":
+        print("Cancelled.")
+        return 0
+    storage.write(to_storage(new))
+    print(f"Wrote {len(new)} rows to {args.storage} ({len(old)} before).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Report what importing the app's modules costs at cold start, using `python -X importtime`."""
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MODULES = ["utils.weight_analysis", "components.log_form"]
+
+
+def measure(modules: list[str]) -> list[tuple[str, int, int]]:
+    """Import `modules` in a fresh interpreter and return (module, self_us, cumulative_us) rows."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def by_package(rows: list[tuple[str, int, int]]) -> dict[str, int]:
+    totals = defaultdict(int)
+    for name, self_us, _ in rows:
+        totals[name.split(".")[0]] += self_us
+    return dict(sorted(totals.items(), key=lambda kv: kv[1], reverse=True))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import time report.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES,
+                        help=f"Modules to import (default: {' '.join(DEFAULT_MODULES)})")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to list")
+    parser.add_argument("--json", action="store_true", help="Print a JSON summary for tracking over time")
+    args = parser.parse_args()
+
+    rows = measure(args.modules)
+    packages = by_package(rows)
+    total_ms = sum(self_us for _, self_us, _ in rows) / 1000
+
+    if args.json:
+        print(json.dumps({
+            "modules": args.modules,
+            "total_ms": round(total_ms, 1),
+            "packages_ms": {k: round(v / 1000, 1) for k, v in list(packages.items())[:args.top]},
+        }))
+        return 0
+
+    print(f"Importing {', '.join(args.modules)}: {total_ms:.1f} ms across {len(rows)} modules\n")
+    print(f"{'package':<30}{'ms':>10}{'share':>8}")
+    for name, us in list(packages.items())[:args.top]:
+        print(f"{name:<30}{us / 1000:>10.1f}{us / 1000 / total_ms:>8.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Copy the weight tracker log from one storage backend to another, e.g. Drive to SQLite."""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.storage import open_storage
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Copy the weight log between storage backends.")
+    parser.add_argument("source", help="Drive file id, csv://path or sqlite://path to read from")
+    parser.add_argument("target", help="Drive file id, csv://path or sqlite://path to overwrite")
+    args = parser.parse_args()
+
+    df = open_storage(args.source).read(stale_ok=False)
+    target = open_storage(args.target)
+    target.write(df)
+    print(f"Copied {len(df)} rows from {args.source} to {args.target}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
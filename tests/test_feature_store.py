@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate
+from utils.feature_store import FeatureStore, signature
+
+
+def _log():
+    df = generate(2, seed=3, missing=0.05, end='2024-12-31')
+    dates = pd.to_datetime(df['date'])
+    # A short gap (filled when imputing) and a long one (never filled) among the appended days.
+    short = pd.date_range('2024-12-10', periods=3)
+    long = pd.date_range('2024-12-20', periods=5)
+    return df[~dates.isin(short.append(long))].reset_index(drop=True)
+
+
+@pytest.mark.parametrize('impute', [None, 'interpolate'])
+def test_append_matches_rebuild(impute):
+    raw = _log()
+    split = len(raw) - 40
+    store = FeatureStore(raw.iloc[:split], impute=impute)
+    for row in raw.iloc[split:].itertuples():
+        store.append(row.date, row.weight_lbs, row.food, row.exer)
+    full = FeatureStore(raw, impute=impute)
+
+    pd.testing.assert_frame_equal(store.frame(), full.frame(), atol=1e-4)
+    np.testing.assert_array_equal(store.imputed(), full.imputed())
+    assert store.signature == full.signature == signature(raw)
+    assert store.gaps() == full.gaps()
+    if impute:
+        assert store.imputed().sum() > 0
+
+
+def test_imputed_rows_are_not_logged():
+    raw = _log()
+    store = FeatureStore(raw, impute='interpolate')
+    assert len(store.raw()) == len(raw)
+    assert not store.contains('2024-12-11')
+    assert len(store.missing_dates()) == len(FeatureStore(raw).missing_dates())
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from utils.storage import DuplicateDateError, JournaledStorage, LocalCSVStorage
+
+
+def _row(date, weight):
+    return {'date': date, 'weight_lbs': weight, 'exer': 1, 'food': 5, 'weight_kgs': None}
+
+
+@pytest.fixture
+def journaled(tmp_path):
+    base = LocalCSVStorage(str(tmp_path / 'weight.csv'))
+    base.write(pd.DataFrame([_row('2024-01-01', 150.0), _row('2024-01-02', 151.0), _row('2024-01-03', 152.0)]))
+    # No background compaction during a test.
+    return JournaledStorage(base, str(tmp_path / 'cache' / 'weight.journal.jsonl'), compact_delay=3600)
+
+
+def _weights(df):
+    return dict(zip(df['date'], df['weight_lbs']))
+
+
+def test_replay_puts_and_deletes(journaled):
+    journaled.append(_row('2024-01-05', 153.0))
+    journaled.delete(['2024-01-02'])
+    journaled.append(_row('2024-01-04', 152.5))
+    journaled.delete(['2024-01-05'])
+    journaled.append(_row('2024-01-05', 154.0))
+
+    expected = {'2024-01-01': 150.0, '2024-01-03': 152.0, '2024-01-04': 152.5, '2024-01-05': 154.0}
+    assert _weights(journaled.read()) == expected
+    assert list(journaled.read()['date']) == sorted(expected)
+    assert journaled.pending == 5
+    # The base file is untouched until compaction.
+    assert len(journaled.base.read()) == 3
+
+    journaled.compact()
+    assert journaled.pending == 0
+    assert _weights(journaled.base.read()) == expected
+    assert _weights(journaled.read()) == expected
+
+
+def test_append_refuses_logged_dates(journaled):
+    with pytest.raises(DuplicateDateError):
+        journaled.append(_row('2024-01-03', 199.0))
+    journaled.append(_row('2024-01-04', 153.0))
+    with pytest.raises(DuplicateDateError):
+        journaled.append(_row('2024-01-04', 199.0))
+    assert journaled.pending == 1
+    assert _weights(journaled.read())['2024-01-03'] == 152.0
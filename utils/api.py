@@ -0,0 +1,300 @@
+"""
+Read-only JSON API over the weight log, for dashboards and phone widgets.
+
+    python -m utils.api --storage csv://data/weight.csv --port 8502
+
+Endpoints (GET): `/averages`, `/last?n=20`, `/missing`, `/forecast?mode=regression|arima`,
+`/health` and `/metrics` (Prometheus text). `unit=lbs|kgs` selects the weight unit.
+Responses carry an ETag derived from the data version, so a client sending it back in
+If-None-Match gets a 304 without the body being rebuilt or resent.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from utils import instrument
+from utils.feature_store import LBS_TO_KGS
+from utils.instrument import timed
+from utils.lru import LRUCache
+from utils.storage import DEFAULT_SOURCE, DrivePool, load_service_account_info, open_storage
+
+ROOT = Path(__file__).resolve().parent.parent
+# Seconds between checks of the storage for new entries; like the app's read_log TTL.
+DEFAULT_TTL = 60
+MAX_LAST_N = 1000
+
+logger = logging.getLogger('weight_control.api')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _clean(value, digits=4):
+    """JSON-safe scalars: numpy types to Python, NaN to null, floats rounded."""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, digits)
+    return value
+
+
+class Dataset:
+    """
+    One log and the `wana` built from it, shared by every request thread.
+
+    The storage is re-read at most every `ttl` seconds; the analysis is only rebuilt when
+    the content signature changes. Responses are cached by data version and request, so
+    repeated requests for unchanged data cost a dictionary lookup.
+    """
+
+    def __init__(self, source, ttl=DEFAULT_TTL, impute=None, cache_size=256):
+        self.source = source
+        self.ttl = ttl
+        self.impute = impute
+        self.storage = open_storage(source, drive_pool=DrivePool(load_service_account_info, size=2))
+        self.responses = LRUCache(maxsize=cache_size)
+        self._analysis = None
+        self._checked = 0.0
+        self._refresh_lock = threading.Lock()
+        # wana switches units in place, so keying and building a response hold this lock.
+        self._analysis_lock = threading.Lock()
+        # Slow responses are built under this one instead, so they neither block the others nor run twice.
+        self._slow_lock = threading.Lock()
+
+    def analysis(self):
+        if time.monotonic() - self._checked < self.ttl and self._analysis is not None:
+            return self._analysis
+        with self._refresh_lock:
+            if time.monotonic() - self._checked >= self.ttl or self._analysis is None:
+                self._refresh()
+        return self._analysis
+
+    @timed('api.refresh')
+    def _refresh(self):
+        from utils.feature_store import compact, signature
+        from utils.weight_analysis import wana
+        raw_df = compact(self.storage.read())
+        current = self._analysis
+        if current is None or not current.matches(self.source, signature(raw_df)):
+            self._analysis = wana(self.source, raw_df, storage=self.storage, impute=self.impute)
+        self._checked = time.monotonic()
+
+    def respond(self, endpoint, params):
+        """(etag, body bytes) for `endpoint`; the body is built only on a cache miss."""
+        analysis, spec = self.analysis(), ENDPOINTS[endpoint]
+        with self._analysis_lock:
+            analysis.change_measurement(params['unit'])
+            key = spec.key(analysis, params)
+            etag = '"' + hashlib.sha1(repr((endpoint, key)).encode()).hexdigest()[:20] + '"'
+            body = self.responses.get(etag)
+            if body is None and not spec.slow:
+                body = self._build(endpoint, analysis, params, etag)
+        if body is None:
+            with self._slow_lock:
+                body = self.responses.get(etag) or self._build(endpoint, analysis, params, etag)
+        return etag, body
+
+    def _build(self, endpoint, analysis, params, etag):
+        with timed(f'api.{endpoint}'):
+            body = json.dumps(ENDPOINTS[endpoint].build(analysis, params), separators=(',', ':')).encode()
+        self.responses.put(etag, body)
+        return body
+
+
+# ── Endpoints ──────────────────────────────────────────────────────────────────
+# Each has `key(analysis, params)`, everything the response depends on, and
+# `build(analysis, params)`, the JSON payload. A `slow` endpoint is built outside the
+# shared lock, so its `build` must not rely on the unit `wana` is switched to.
+
+class _endpoint:
+    slow = False
+
+
+class _averages(_endpoint):
+    @staticmethod
+    def key(analysis, params):
+        return (analysis.version, params['unit'], analysis.forecast_key('regression')[3:])
+
+    @staticmethod
+    def build(analysis, params):
+        store, col = analysis.store, analysis.weight_col
+        scale = LBS_TO_KGS if params['unit'] == 'kgs' else 1.0
+        gains = analysis.estimate_gain_weight()
+        return {
+            'unit': params['unit'],
+            'date': store.last_date.strftime('%Y-%m-%d'),
+            'weight': _clean(store.last(col)),
+            'weight_avg_7d': _clean(store.avg(col)[-1]),
+            'weight_std_21d': _clean(store.std(col)[-1]),
+            'weight_min': _clean(analysis.weight_min),
+            # Unscaled, unlike the min-max scaled `*_avg_7d` columns of `/last`.
+            'food_score_7d': _clean(store.avg('food')[-1]),
+            'exercise_rate_7d': _clean(store.avg('exer')[-1]),
+            'weekly_gain': {label: _clean(g * scale) for label, g in zip(('expected', 'bad', 'good'), gains)},
+        }
+
+
+class _last(_endpoint):
+    @staticmethod
+    def key(analysis, params):
+        return (analysis.version, params['unit'], params['n'])
+
+    @staticmethod
+    def build(analysis, params):
+        df = analysis.last_n(params['n'])
+        rows = [{'date': date.strftime('%Y-%m-%d'), **{col: _clean(v) for col, v in zip(df.columns, values)}}
+                for date, values in zip(df.index, df.itertuples(index=False, name=None))]
+        return {'unit': params['unit'], 'rows': rows}
+
+
+class _missing(_endpoint):
+    @staticmethod
+    def key(analysis, params):
+        # "Missing" runs up to today, so the answer also changes at midnight.
+        return (analysis.version, analysis.today.strftime('%Y-%m-%d'))
+
+    @staticmethod
+    def build(analysis, params):
+        gaps = analysis.missing_ranges()
+        return {
+            'count': sum((last - first).days + 1 for first, last in gaps),
+            'gaps': [{'first': first.strftime('%Y-%m-%d'), 'last': last.strftime('%Y-%m-%d'),
+                      'days': (last - first).days + 1} for first, last in gaps],
+        }
+
+
+class _forecast(_endpoint):
+    # A cold ARIMA fit takes seconds.
+    slow = True
+
+    @staticmethod
+    def key(analysis, params):
+        return analysis.forecast_key(params['mode'], params['unit'])
+
+    @staticmethod
+    def build(analysis, params):
+        fc = analysis.forecast(params['mode'], measurement=params['unit'])
+        return {'unit': params['unit'], 'mode': params['mode'], **fc.to_dict()}
+
+
+class _health(_endpoint):
+    @staticmethod
+    def key(analysis, params):
+        return (analysis.version,)
+
+    @staticmethod
+    def build(analysis, params):
+        return {'status': 'ok', 'rows': len(analysis.store),
+                'last_date': analysis.store.last_date.strftime('%Y-%m-%d') if len(analysis.store) else None}
+
+
+ENDPOINTS = {'averages': _averages, 'last': _last, 'missing': _missing, 'forecast': _forecast, 'health': _health}
+
+
+def parse_params(query):
+    q = {k: v[-1] for k, v in parse_qs(query).items()}
+    params = {'unit': q.get('unit', 'lbs'), 'mode': q.get('mode', 'regression')}
+    if params['unit'] not in ('lbs', 'kgs'):
+        raise BadRequest("unit must be lbs or kgs")
+    if params['mode'] not in ('regression', 'arima'):
+        raise BadRequest("mode must be regression or arima")
+    try:
+        params['n'] = int(q.get('n', 20))
+    except ValueError:
+        raise BadRequest("n must be an integer")
+    if not 1 <= params['n'] <= MAX_LAST_N:
+        raise BadRequest(f"n must be between 1 and {MAX_LAST_N}")
+    return params
+
+
+# ── Server ─────────────────────────────────────────────────────────────────────
+
+class Handler(BaseHTTPRequestHandler):
+    dataset = None
+    server_version = 'WeightControlAPI/1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoint = url.path.strip('/') or 'health'
+        if endpoint == 'metrics':
+            self._send(HTTPStatus.OK, instrument.prometheus_text().encode(), 'text/plain; version=0.0.4')
+            return
+        if endpoint not in ENDPOINTS:
+            self._error(HTTPStatus.NOT_FOUND, f"unknown endpoint '/{endpoint}'")
+            return
+        try:
+            etag, body = self.dataset.respond(endpoint, parse_params(url.query))
+        except BadRequest as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        except Exception as e:
+            logger.exception("request failed: %s", self.path)
+            self._error(HTTPStatus.SERVICE_UNAVAILABLE, f"{type(e).__name__}: {e}")
+            return
+        if etag in [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]:
+            self._send(HTTPStatus.NOT_MODIFIED, b'', headers={'ETag': etag})
+            return
+        self._send(HTTPStatus.OK, body, 'application/json', headers={'ETag': etag})
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({'error': message}).encode(), 'application/json')
+
+    def _send(self, status, body, content_type=None, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        # Clients may keep responses but should revalidate; a 304 is cheap.
+        self.send_header('Cache-Control', 'no-cache')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+def make_server(dataset, host='127.0.0.1', port=8502):
+    handler = type('DatasetHandler', (Handler,), {'dataset': dataset})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve the weight log's analytics as read-only JSON.")
+    parser.add_argument("--storage", default=DEFAULT_SOURCE,
+                        help="Drive file id, csv://path or sqlite://path (default: $WEIGHT_STORAGE or the Drive log)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="Seconds between checks for new entries")
+    parser.add_argument("--impute", choices=["interpolate"], help="Fill short gaps before computing the averages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    os.chdir(ROOT)  # model parameter paths are relative to the repo
+    server = make_server(Dataset(args.storage, ttl=args.ttl, impute=args.impute), args.host, args.port)
+    logger.info("Serving %s on http://%s:%d", args.storage, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import warnings
+
+import numpy as np
+
+from utils import local_cache
+from utils.feature_store import LBS_TO_KGS
+from utils.forecast import MAX_WEEKS, Forecast
+from utils.lru import LRUCache
+
+# Food/exercise levels (scaled 7-day average) for the pessimistic and optimistic paths,
+# as in forecast_model/analysis.ipynb.
+BAD_EXOG = 0.25
+GOOD_EXOG = 0.75
+# After this many days appended with fixed parameters, re-estimate them (warm-started).
+REFIT_EVERY = 7
+ALPHA = 0.05
+
+_MODELS = LRUCache(maxsize=16)
+# One lock per source: a cold fit takes seconds and must not hold up other logs.
+_LOCKS = {}
+_LOCKS_LOCK = threading.Lock()
+
+
+def _source_lock(source):
+    with _LOCKS_LOCK:
+        return _LOCKS.setdefault(source, threading.Lock())
+
+
+def load_spec(path):
+    with open(path, 'r') as f:
+        spec = json.load(f)
+    spec['order'] = tuple(spec['order'])
+    return spec
+
+
+def _cache_path(source):
+    name = hashlib.sha1(source.encode()).hexdigest()[:16]
+    return local_cache.CACHE_DIR / f'arima-{name}.pkl'
+
+
+def _load_state(source):
+    try:
+        with open(_cache_path(source), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _save_state(source, state):
+    path = _cache_path(source)
+    try:
+        local_cache.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _model(endog, exog, order):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    return SARIMAX(endog, exog=exog[:, None], order=order)
+
+
+def _fit(endog, exog, order, start_params):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return _model(endog, exog, order).fit(start_params=start_params, disp=False)
+
+
+def _smooth(endog, exog, order, params):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return _model(endog, exog, order).smooth(params)
+
+
+def fitted_model(source, endog, exog, spec):
+    """
+    SARIMAX results for `endog`/`exog`, reusing earlier work for `source` where possible.
+
+    The last fitted parameters for each source are kept in memory and on disk with the data
+    they were fitted on. Identical data reuses the fitted results. When the new data only
+    extends the old series, the parameters are applied to the longer series without
+    optimisation (like statsmodels' `append(refit=False)`), and re-estimated every
+    `REFIT_EVERY` new days starting from the previous values. Only a source with no earlier
+    fit is estimated cold, starting from the parameters in `spec`.
+    """
+    order = spec['order']
+    with _source_lock(source):
+        state = _MODELS.get(source) or _load_state(source)
+        results, same_data = None, False
+        if state is not None and state['order'] == order:
+            n = len(state['endog'])
+            extends = (len(endog) >= n and np.array_equal(endog[:n], state['endog'])
+                       and np.allclose(exog[:n], state['exog'], equal_nan=True))
+            if extends and len(endog) - state['fitted_n'] < REFIT_EVERY:
+                params, fitted_n = state['params'], state['fitted_n']
+                same_data = len(endog) == n
+                if same_data:
+                    results = state.get('results')
+                if results is None:
+                    results = _smooth(endog, exog, order, params)
+            else:
+                # Due for re-estimation, or the history itself changed: warm start.
+                results = _fit(endog, exog, order, state['params'])
+                params, fitted_n = results.params, len(endog)
+        if results is None:
+            results = _fit(endog, exog, order, np.array(list(spec['params'].values())))
+            params, fitted_n = results.params, len(endog)
+        if not same_data:
+            # Only a changed state is written; identical data is already on disk.
+            state = {'order': order, 'endog': endog.copy(), 'exog': exog.copy(),
+                     'params': np.asarray(params), 'fitted_n': fitted_n}
+            _save_state(source, state)
+        _MODELS.put(source, dict(state, results=results))
+    return results
+
+
+def build_arima_forecast(source, store, spec, measurement='lbs', max_weeks=MAX_WEEKS):
+    """Expected/pessimistic/optimistic ARIMA paths plus `lower`/`upper` bounds of the expected path."""
+    df = store.frame()
+    df = df[df['food_exercise_avg_7d'].notna()]
+    endog = df['weight_lbs'].to_numpy(dtype='float64')
+    exog = df['food_exercise_avg_7d'].to_numpy(dtype='float64')
+    results = fitted_model(source, endog, exog, spec)
+    steps = max_weeks * 7
+    scenarios = {'expected': exog[-1], 'bad': BAD_EXOG, 'good': GOOD_EXOG}
+    paths = {}
+    for label, level in scenarios.items():
+        fc = results.get_forecast(steps=steps, exog=np.full((steps, 1), level))
+        paths[label] = np.asarray(fc.predicted_mean)
+        if label == 'expected':
+            ci = np.asarray(fc.conf_int(alpha=ALPHA))
+            paths['lower'], paths['upper'] = ci[:, 0], ci[:, 1]
+    labels = ['expected', 'bad', 'good', 'lower', 'upper']
+    values = np.array([np.concatenate([[endog[-1]], paths[label]]) for label in labels])
+    if measurement == 'kgs':
+        values = values * LBS_TO_KGS
+    return Forecast(store.last_date, labels, values)
@@ -0,0 +1,328 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+LBS_TO_KGS = 0.453592
+
+BASE_COLS = ['weight_lbs', 'exer', 'food', 'weight_kgs']
+FEATURE_COLS = ['weight_lbs', 'weight_kgs', 'food', 'exer']
+AVG_WINDOW = 7
+STD_WINDOW = 21
+SCALED_COLS = ['food', 'exer']
+# Storage types of the logged columns; everything else is derived from these.
+DTYPES = {'weight_lbs': 'float32', 'exer': 'bool', 'food': 'int8'}
+# Columns whose rolling features are kept up to date on append; the rest are derived on demand.
+_TRACKED = {'weight_lbs': True, 'food': False, 'exer': False}
+# With imputation on, gaps of up to this many missing days are filled before the rolling features.
+IMPUTE_MAX_DAYS = 3
+IMPUTE_MODES = ('interpolate',)
+_INITIAL_CAPACITY = 64
+# Decimals kept when float32 arrays are widened for display: the logged precision for weights
+# (as in `_canonical`) and what float32 holds for the rolling features; beyond that is noise.
+VALUE_DIGITS = 3
+FEATURE_DIGITS = 4
+# Every build gets a new generation; appends keep it, so clients can tell an extension from new data.
+_GENERATIONS = itertools.count(1)
+
+
+def compact(raw_df):
+    """The log as `date` plus the three logged columns in their compact types, sorted by date."""
+    if raw_df is None:
+        return None
+    df = pd.DataFrame({'date': pd.to_datetime(raw_df['date'])})
+    for col, dtype in DTYPES.items():
+        df[col] = raw_df[col].to_numpy().astype(dtype)
+    return df.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def _canonical(raw_df):
+    # Weights are rounded so a float32 copy of the log hashes like the float64 one it came from.
+    return pd.DataFrame({
+        'date': pd.to_datetime(raw_df['date']).dt.strftime('%Y-%m-%d').to_numpy(),
+        'weight_lbs': raw_df['weight_lbs'].astype('float64').round(3).to_numpy(),
+        'exer': raw_df['exer'].astype('int64').to_numpy(),
+        'food': raw_df['food'].astype('int64').to_numpy(),
+    })
+
+
+def signature(raw_df):
+    """Order-independent content hash of a log; row hashes are summed so appends can update it in O(1)."""
+    hashes = pd.util.hash_pandas_object(_canonical(raw_df), index=False).to_numpy()
+    return int(hashes.sum(dtype=np.uint64))
+
+
+def _day(date):
+    return np.int32(pd.Timestamp(date).normalize().value // 86_400_000_000_000)
+
+
+def _fill_short_gaps(df, max_days=IMPUTE_MAX_DAYS):
+    """
+    `df` (compact, sorted) with a row for every missing day in gaps of up to `max_days` days:
+    weight interpolated linearly between the entries either side, food and exercise carried
+    forward. Also returns which rows were filled in.
+    """
+    if len(df) < 2:
+        return df, np.zeros(len(df), dtype=bool)
+    daily = df.set_index('date')
+    daily = daily.reindex(pd.date_range(daily.index[0], daily.index[-1], freq='D'))
+    real = daily['weight_lbs'].notna().to_numpy()
+    # Missing days share the run id of the entry before them; the run's size is the gap length.
+    gap_len = pd.Series(~real).groupby(np.cumsum(real)).transform('sum').to_numpy()
+    keep = real | (gap_len <= max_days)
+    filled = pd.DataFrame({'date': daily.index[keep]})
+    filled['weight_lbs'] = daily['weight_lbs'].astype('float64').interpolate().to_numpy()[keep].astype('float32')
+    for col in ('exer', 'food'):
+        filled[col] = daily[col].ffill().to_numpy()[keep].astype(DTYPES[col])
+    return filled, ~real[keep]
+
+
+def _rolling(x, window, fn):
+    return getattr(pd.Series(x, dtype='float64').rolling(window=window), fn)().to_numpy()
+
+
+class FeatureStore:
+    """
+    The weight log in compact typed arrays, with rolling features kept as running window sums.
+
+    Dates are int32 day numbers, weight float32, food int8 and exercise bool; the stored
+    features are the 7-day means and the 21-day weight std. Kilograms, the scaled averages
+    and the other std columns are derived when asked for, and `frame()` builds the wide
+    table on demand without keeping it.
+
+    A full build is vectorised over the whole history; `append` adds one day in O(1)
+    by updating the 7-day sums and the 21-day sums of squares. Anything that is not a
+    strict append (backfilled or deleted dates) goes through `rebuild`.
+
+    Missing dates are kept as a gap index, a (first, last) day range per gap between
+    entries, extended on append. With `impute='interpolate'` short gaps are filled in
+    (`IMPUTE_MAX_DAYS`) so the rolling features run over whole days; filled rows are
+    flagged and never count as logged.
+    """
+
+    def __init__(self, raw_df, impute=None):
+        if impute not in (None,) + IMPUTE_MODES:
+            raise ValueError(f"Unknown imputation mode '{impute}'.")
+        self.impute = impute
+        self.rebuild(raw_df)
+
+    def rebuild(self, raw_df):
+        df = compact(raw_df)
+        self._signature = signature(df)
+        logged = df['date'].to_numpy(dtype='datetime64[D]').astype('int64')
+        gaps = np.flatnonzero(np.diff(logged) > 1)
+        self._gap_first = (logged[gaps] + 1).tolist()
+        self._gap_last = (logged[gaps + 1] - 1).tolist()
+        imputed = np.zeros(len(df), dtype=bool)
+        if self.impute:
+            df, imputed = _fill_short_gaps(df)
+        n = len(df)
+        capacity = max(_INITIAL_CAPACITY, 2 * n)
+        self._n = n
+        self._days = np.empty(capacity, dtype='int32')
+        self._days[:n] = df['date'].to_numpy(dtype='datetime64[D]').astype('int64')
+        self._imputed = np.zeros(capacity, dtype=bool)
+        self._imputed[:n] = imputed
+        self._values, self._avg, self._std = {}, {}, {}
+        self._sum, self._std_sum, self._std_sumsq, self._ref = {}, {}, {}, {}
+        for col, dtype in DTYPES.items():
+            x = np.zeros(capacity, dtype=dtype)
+            x[:n] = df[col].to_numpy()
+            self._values[col] = x
+            x = x[:n].astype('float64')
+            self._avg[col] = np.full(capacity, np.nan, dtype='float32')
+            self._avg[col][:n] = _rolling(x, AVG_WINDOW, 'mean')
+            self._sum[col] = x[max(0, n - AVG_WINDOW):].sum()
+            if _TRACKED[col]:
+                self._std[col] = np.full(capacity, np.nan, dtype='float32')
+                self._std[col][:n] = _rolling(x, STD_WINDOW, 'std')
+                # Sums for the std window are shifted by a reference value to keep the
+                # sum-of-squares update numerically stable for values around 160 lbs.
+                self._ref[col] = x[0] if n else 0.0
+                tail = x[max(0, n - STD_WINDOW):] - self._ref[col]
+                self._std_sum[col] = tail.sum()
+                self._std_sumsq[col] = (tail ** 2).sum()
+        self.generation = next(_GENERATIONS)
+        self.version = 0
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def signature(self):
+        return self._signature
+
+    @property
+    def last_date(self):
+        return self.dates()[-1] if self._n else None
+
+    @property
+    def nbytes(self):
+        arrays = [self._days, self._imputed] + [a for d in (self._values, self._avg, self._std) for a in d.values()]
+        return sum(a.nbytes for a in arrays)
+
+    def _grow(self):
+        capacity = 2 * len(self._days)
+        self._days = np.resize(self._days, capacity)
+        self._imputed = np.resize(self._imputed, capacity)
+        for arrays in (self._values, self._avg, self._std):
+            for col, x in arrays.items():
+                arrays[col] = np.resize(x, capacity)
+
+    def days(self):
+        """Dates as int32 days since 1970-01-01."""
+        return self._days[:self._n]
+
+    def dates(self):
+        return pd.DatetimeIndex(self._days[:self._n].astype('datetime64[D]').astype('datetime64[ns]'), name='date')
+
+    def contains(self, date):
+        days = self._days[:self._n]
+        target = _day(date)
+        i = np.searchsorted(days, target)
+        return bool(i < self._n and days[i] == target and not self._imputed[i])
+
+    def can_append(self, date):
+        return self._n == 0 or _day(date) > self._days[self._n - 1]
+
+    def append(self, date, weight, food, exercise):
+        if not self.can_append(date):
+            raise ValueError(f"{date} is not after the last entry; rebuild instead.")
+        day = _day(date)
+        if self._n:
+            i = self._n - 1
+            last = int(self._days[i])
+            missing = day - last - 1
+            if missing > 0:
+                self._gap_first.append(last + 1)
+                self._gap_last.append(int(day) - 1)
+            if self.impute and 0 < missing <= IMPUTE_MAX_DAYS:
+                w0 = float(self._values['weight_lbs'][i])
+                food0, exer0 = self._values['food'][i], self._values['exer'][i]
+                for k in range(1, missing + 1):
+                    self._push(last + k, w0 + (float(weight) - w0) * k / (missing + 1), food0, exer0, imputed=True)
+        self._push(day, weight, food, exercise)
+        self._signature = (self._signature + int(self._row_hash(date, weight, food, exercise))) % 2**64
+        self.version += 1
+
+    def _push(self, day, weight, food, exercise, imputed=False):
+        if self._n == len(self._days):
+            self._grow()
+        i = self._n
+        n = i + 1
+        self._days[i] = day
+        self._imputed[i] = imputed
+        row = {'weight_lbs': weight, 'exer': bool(exercise), 'food': int(food)}
+        for col in DTYPES:
+            values = self._values[col]
+            values[i] = row[col]
+            # Sums use the stored (rounded to storage type) value, as a rebuild would.
+            x = float(values[i])
+            self._sum[col] += x
+            if n > AVG_WINDOW:
+                self._sum[col] -= float(values[i - AVG_WINDOW])
+            self._avg[col][i] = self._sum[col] / AVG_WINDOW if n >= AVG_WINDOW else np.nan
+            if not _TRACKED[col]:
+                continue
+            shifted = x - self._ref[col]
+            self._std_sum[col] += shifted
+            self._std_sumsq[col] += shifted ** 2
+            if n > STD_WINDOW:
+                leaving = float(values[i - STD_WINDOW]) - self._ref[col]
+                self._std_sum[col] -= leaving
+                self._std_sumsq[col] -= leaving ** 2
+            if n >= STD_WINDOW:
+                var = (self._std_sumsq[col] - self._std_sum[col] ** 2 / STD_WINDOW) / (STD_WINDOW - 1)
+                self._std[col][i] = np.sqrt(max(var, 0.0))
+            else:
+                self._std[col][i] = np.nan
+        self._n = n
+
+    @staticmethod
+    def _row_hash(date, weight, food, exercise):
+        row = pd.DataFrame({'date': [date], 'weight_lbs': [weight], 'exer': [exercise], 'food': [food]})
+        return pd.util.hash_pandas_object(_canonical(row), index=False).to_numpy()[0]
+
+    def values(self, col):
+        if col == 'weight_kgs':
+            return self.values('weight_lbs') * LBS_TO_KGS
+        x = self._values[col][:self._n]
+        return np.round(x.astype('float64'), VALUE_DIGITS) if x.dtype == np.float32 else x
+
+    def avg(self, col):
+        """Unscaled 7-day rolling mean of `col`."""
+        if col == 'weight_kgs':
+            return self.avg('weight_lbs') * LBS_TO_KGS
+        return self._avg[col][:self._n]
+
+    def std(self, col):
+        """21-day rolling standard deviation of `col`."""
+        if col == 'weight_kgs':
+            return self.std('weight_lbs') * LBS_TO_KGS
+        if col in self._std:
+            return self._std[col][:self._n]
+        return _rolling(self.values(col), STD_WINDOW, 'std')
+
+    def last(self, col):
+        if col == 'weight_kgs':
+            return self.last('weight_lbs') * LBS_TO_KGS
+        x = self._values[col][self._n - 1]
+        return round(float(x), VALUE_DIGITS) if x.dtype == np.float32 else x
+
+    def min(self, col):
+        return np.nanmin(self.values(col))
+
+    def imputed(self):
+        """Which rows were filled in rather than logged."""
+        return self._imputed[:self._n]
+
+    def gaps(self, until=None):
+        """
+        Missing dates as (first, last) Timestamp ranges, oldest first: the gaps between
+        entries, plus the days after the last entry up to `until` if given. O(gaps).
+        """
+        first, last = self.gap_days(until)
+        return [(pd.Timestamp(f, unit='D'), pd.Timestamp(l, unit='D')) for f, l in zip(first.tolist(), last.tolist())]
+
+    def gap_days(self, until=None):
+        """`gaps` as two int arrays of day numbers (first and last missing day of each gap)."""
+        first, last = list(self._gap_first), list(self._gap_last)
+        if until is not None and self._n and _day(until) > self._days[self._n - 1]:
+            first.append(int(self._days[self._n - 1]) + 1)
+            last.append(int(_day(until)))
+        return np.array(first, dtype='int64'), np.array(last, dtype='int64')
+
+    def missing_dates(self, until=None):
+        """Every missing date, expanded from the gap index without scanning the log."""
+        first, last = self.gap_days(until)
+        lengths = last - first + 1
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        days = np.repeat(first, lengths) + offsets
+        return pd.DatetimeIndex(days.astype('datetime64[D]').astype('datetime64[ns]'))
+
+    def raw(self):
+        """The logged rows (`date` plus the logged columns, no filled-in days), e.g. to rebuild from."""
+        logged = ~self.imputed()
+        return pd.DataFrame({'date': self.dates()[logged], **{col: self.values(col)[logged] for col in DTYPES}})
+
+    def _scaled_avg(self, col):
+        avg = self.avg(col).astype('float64')
+        if np.isnan(avg).all():
+            return avg
+        lo, hi = np.nanmin(avg), np.nanmax(avg)
+        scale = hi - lo if hi > lo else 1.0
+        return (avg - lo) / scale
+
+    def frame(self):
+        """Logged and derived columns as one float64 DataFrame indexed by date, built on each call."""
+        data = {col: self.values(col).astype('float64') for col in BASE_COLS}
+        for col in SCALED_COLS:
+            data[col] = self.values(col).astype('int64')
+        for col in FEATURE_COLS:
+            data[f'{col}_avg_7d'] = np.round(self.avg(col).astype('float64'), FEATURE_DIGITS)
+        for col in FEATURE_COLS:
+            data[f'{col}_std_21d'] = np.round(self.std(col).astype('float64'), FEATURE_DIGITS)
+        for col in SCALED_COLS:
+            data[f'{col}_avg_7d'] = self._scaled_avg(col)
+        data['food_exercise_avg_7d'] = 0.7 * data['food_avg_7d'] + 0.3 * data['exer_avg_7d']
+        return pd.DataFrame(data, index=self.dates())
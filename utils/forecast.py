@@ -0,0 +1,101 @@
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils.feature_store import AVG_WINDOW, LBS_TO_KGS
+
+MAX_WEEKS = 10
+PERCENTILES = (10, 25, 50, 75, 90)
+# Food/exercise scores used for the fixed pessimistic and optimistic scenarios.
+BAD_SCORE = 0.1
+GOOD_SCORE = 0.9
+
+
+@lru_cache(maxsize=8)
+def _load_params(path, mtime):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_params(path):
+    """Regression parameters from `path`, re-read only when the file changes."""
+    return _load_params(path, os.path.getmtime(path))
+
+
+def score(param, food_mean, exer_sum):
+    """Weighted food/exercise score the regression was fitted on (vectorised)."""
+    food_n = (np.asarray(food_mean) - param['food_min']) / param['food_range']
+    exer_n = (np.asarray(exer_sum) - param['exer_min']) / param['exer_range']
+    return param['w1'] * exer_n + (1 - param['w1']) * food_n
+
+
+def weekly_gain(param, scores):
+    return param['intercept'] + param['slope'] * np.asarray(scores)
+
+
+class Forecast:
+    """
+    Weight paths for every scenario and every day up to `MAX_WEEKS` ahead, as one array.
+
+    `values[i, d]` is the weight of scenario `labels[i]` `d` days after `start`. Changing
+    the horizon is a slice of this array rather than a new computation.
+    """
+
+    def __init__(self, start, labels, values, gains=None):
+        self.start = pd.Timestamp(start)
+        self.labels = list(labels)
+        self.values = np.asarray(values, dtype='float64')
+        self.start_weight = float(self.values[0, 0])
+        self.gains = None if gains is None else np.asarray(gains, dtype='float64')
+        self.dates = pd.date_range(self.start, periods=self.values.shape[1], freq='D')
+
+    @classmethod
+    def linear(cls, start, start_weight, labels, gains, max_weeks=MAX_WEEKS):
+        """Straight-line paths from `start_weight`, one per weekly gain."""
+        gains = np.asarray(gains, dtype='float64')
+        days = np.arange(max_weeks * 7 + 1)
+        return cls(start, labels, float(start_weight) + gains[:, None] * (days[None, :] / 7), gains=gains)
+
+    def __getitem__(self, label):
+        return self.values[self.labels.index(label)]
+
+    def horizon(self, num_weeks):
+        """Dates and scenario values for the first `num_weeks` weeks (inclusive of the start)."""
+        end = num_weeks * 7 + 1
+        return self.dates[:end], self.values[:, :end]
+
+    def at(self, num_weeks):
+        return {label: float(v) for label, v in zip(self.labels, self.values[:, num_weeks * 7])}
+
+    def to_dict(self):
+        out = {
+            'start': self.start.strftime('%Y-%m-%d'),
+            'start_weight': round(float(self.start_weight), 2),
+            'labels': self.labels,
+            'weekly': {label: self.values[i, ::7].round(2).tolist() for i, label in enumerate(self.labels)},
+        }
+        if self.gains is not None:
+            out['weekly_gain'] = self.gains.round(4).tolist()
+        return out
+
+
+def build_forecast(store, param, measurement='lbs', max_weeks=MAX_WEEKS, percentiles=PERCENTILES):
+    """
+    Expected, pessimistic and optimistic scenarios plus `p<n>` bands at the n-th percentile
+    of the weekly food/exercise scores seen in the history, all from one broadcast over
+    (scenario, day).
+    """
+    food, exer = store.values('food'), store.values('exer')
+    expected = score(param, food[-AVG_WINDOW:].mean(), exer[-AVG_WINDOW:].sum())
+    history = score(param, store.avg('food'), store.avg('exer') * AVG_WINDOW)
+    history = history[~np.isnan(history)]
+    bands = np.percentile(history, percentiles) if len(history) else np.full(len(percentiles), expected)
+    labels = ['expected', 'bad', 'good'] + [f'p{p}' for p in percentiles]
+    gains = weekly_gain(param, np.concatenate([[expected, BAD_SCORE, GOOD_SCORE], bands]))
+    weight_col = 'weight_kgs' if measurement == 'kgs' else 'weight_lbs'
+    if measurement == 'kgs':
+        gains = gains * LBS_TO_KGS
+    return Forecast.linear(store.last_date, store.avg(weight_col)[-1], labels, gains, max_weeks=max_weeks)
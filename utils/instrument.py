@@ -0,0 +1,99 @@
+import functools
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger('weight_control.timings')
+
+_local = threading.local()
+_lock = threading.Lock()
+_calls = {}
+_seconds = {}
+
+
+class timed:
+    """
+    Time a block (`with timed('name'):`) or a function (`@timed('name')`).
+
+    Every timing feeds the process-wide counters exported by `prometheus_text`. Timings on a
+    thread that called `start_rerun` are also collected for that rerun, with their nesting
+    depth, so the app can show where one script run spent its time.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._depth = getattr(_local, 'depth', 0)
+        _local.depth = self._depth + 1
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        _local.depth = self._depth
+        with _lock:
+            _calls[self.name] = _calls.get(self.name, 0) + 1
+            _seconds[self.name] = _seconds.get(self.name, 0.0) + elapsed
+        records = getattr(_local, 'records', None)
+        if records is not None:
+            records.append({'name': self.name, 'ms': elapsed * 1000, 'depth': self._depth, 'start': self._start})
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(self.name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def start_rerun():
+    _local.records = []
+    _local.depth = 0
+    _local.rerun_start = time.perf_counter()
+
+
+def rerun_timings():
+    """Timings recorded on this thread since `start_rerun`, in the order the blocks started."""
+    records = getattr(_local, 'records', None) or []
+    return sorted(records, key=lambda r: r['start'])
+
+
+def rerun_total_ms():
+    start = getattr(_local, 'rerun_start', None)
+    return (time.perf_counter() - start) * 1000 if start is not None else 0.0
+
+
+def log_rerun(**fields):
+    """Emit this rerun's timings as one structured (JSON) log line."""
+    payload = {'event': 'rerun', 'total_ms': round(rerun_total_ms(), 2),
+               'timings': [{'name': r['name'], 'ms': round(r['ms'], 2), 'depth': r['depth']} for r in rerun_timings()],
+               **fields}
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+    logger.info(json.dumps(payload))
+
+
+def _snapshot():
+    with _lock:
+        return dict(_calls), dict(_seconds)
+
+
+def counters():
+    calls, seconds = _snapshot()
+    return {name: {'calls': calls[name], 'seconds': seconds[name]} for name in calls}
+
+
+def prometheus_text(prefix='weight_control'):
+    """Process-wide counters in the Prometheus text exposition format."""
+    calls, seconds = _snapshot()
+    lines = [f'# HELP {prefix}_op_calls_total Timed operations completed.',
+             f'# TYPE {prefix}_op_calls_total counter']
+    lines += [f'{prefix}_op_calls_total{{op="{name}"}} {calls[name]}' for name in sorted(calls)]
+    lines += [f'# HELP {prefix}_op_seconds_total Time spent in timed operations.',
+              f'# TYPE {prefix}_op_seconds_total counter']
+    lines += [f'{prefix}_op_seconds_total{{op="{name}"}} {seconds[name]:.6f}' for name in sorted(seconds)]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,50 @@
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from utils.instrument import timed
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / 'data' / 'cache'
+META_FIELDS = 'md5Checksum,modifiedTime'
+
+
+def _paths(file_id):
+    return CACHE_DIR / f'{file_id}.parquet', CACHE_DIR / f'{file_id}.json'
+
+
+def _key(meta):
+    return {'md5Checksum': meta.get('md5Checksum'), 'modifiedTime': meta.get('modifiedTime')}
+
+
+def load(file_id, meta=None):
+    """Return the cached log for `file_id`, or None if missing or stale against the Drive `meta`."""
+    data_path, meta_path = _paths(file_id)
+    try:
+        with open(meta_path, 'r') as f:
+            cached = json.load(f)
+        if meta is not None and cached != _key(meta):
+            return None
+        with timed('cache.read'):
+            return pd.read_parquet(data_path)
+    except (OSError, ValueError):
+        return None
+
+
+def save(file_id, meta, df):
+    """Best-effort write; a read-only or full disk just means the next read goes to Drive."""
+    data_path, meta_path = _paths(file_id)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        meta_path.unlink(missing_ok=True)
+        tmp = data_path.with_suffix('.parquet.tmp')
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, data_path)
+        tmp = meta_path.with_suffix('.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(_key(meta), f)
+        os.replace(tmp, meta_path)
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# Points per plotted line; keeps render time and image size flat as the history grows.
+MAX_POINTS = 500
+# The most recent days are always drawn at daily resolution.
+DAILY_DAYS = 56
+# Aggregation periods tried in order for older data, with their length in days.
+RULES = [('W', 7), ('MS', 30.44), ('QS', 91.31), ('YS', 365.25)]
+
+
+def view(df, start=None, end=None):
+    """Rows of the date-indexed `df` between `start` and `end` (inclusive, either may be None)."""
+    if start is None and end is None:
+        return df
+    return df.loc[pd.Timestamp(start) if start is not None else None:pd.Timestamp(end) if end is not None else None]
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: `n_out` of the points in (`x`, `y`) that keep the shape
+    of the line, including its peaks and dips. `x` are dates; `y` must not contain NaN.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+    xs = np.asarray(x, dtype='datetime64[ns]').astype('int64').astype('float64')
+    ys = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+    keep = np.empty(n_out, dtype='int64')
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x, avg_y = xs[hi:edges[i + 2]].mean(), ys[hi:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = xs[-1], ys[-1]
+        area = np.abs((xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def _aggregate(series, budget):
+    span = (series.index[-1] - series.index[0]).days + 1
+    rule = next((rule for rule, days in RULES if span / days <= budget), RULES[-1][0])
+    # Each bucket is drawn at the mean date of its rows, so partial buckets sit where their data is.
+    y = series.resample(rule).mean()
+    x = series.index.to_series().resample(rule).mean()
+    keep = y.notna().to_numpy()
+    return pd.DatetimeIndex(x[keep]), y.to_numpy()[keep]
+
+
+def downsample(series, max_points=MAX_POINTS, daily_days=DAILY_DAYS, method='mean'):
+    """
+    Plot positions and values for the date-indexed `series`, with at most about `max_points`
+    points. The last `daily_days` stay daily; anything older is averaged per week, month,
+    quarter or year (`method='mean'`, for smooth series) or thinned with `lttb`
+    (`method='lttb'`, for raw readings whose extremes matter).
+    """
+    if len(series) <= max_points:
+        return series.index, series.to_numpy()
+    cutoff = series.index[-1] - pd.Timedelta(days=daily_days)
+    older, recent = series[series.index <= cutoff], series[series.index > cutoff]
+    budget = max(max_points - len(recent), 3)
+    older = older.dropna()
+    if method == 'lttb':
+        x, y = lttb(older.index, older.to_numpy(), budget)
+    elif len(older):
+        x, y = _aggregate(older, budget)
+    else:
+        x, y = older.index, older.to_numpy()
+    return x.append(recent.index), np.concatenate([y, recent.to_numpy()])
@@ -0,0 +1,159 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from utils.storage import DuplicateDateError
+
+
+class Outbox:
+    """
+    Log entries waiting to reach storage.
+
+    `submit` only writes the entry to a local JSON file and returns; a background thread
+    then appends it to `storage`, retrying transient failures with exponential backoff.
+    Entries survive restarts and are picked up again when the outbox is next created.
+    After `max_attempts` an entry is marked failed and kept until retried or discarded.
+    A journaled backend accepts the append locally and uploads it later, so its `pending`
+    count and `last_error` are part of `status` too, and `retry_failed` restarts its upload.
+    """
+
+    def __init__(self, storage, path, max_attempts=6, base_delay=2.0, max_delay=300.0, on_saved=None):
+        self.storage = storage
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_saved = on_saved
+        self._cond = threading.Condition()
+        self._entries = self._load()
+        for entry in self._entries:
+            entry['in_flight'] = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def _persist(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._entries, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def submit(self, row):
+        entry = {'id': uuid.uuid4().hex, 'row': row, 'attempts': 0, 'next_try': 0.0,
+                 'status': 'pending', 'error': None, 'in_flight': False}
+        with self._cond:
+            self._entries.append(entry)
+            self._persist()
+            self._cond.notify()
+        return entry['id']
+
+    def status(self):
+        with self._cond:
+            pending = [e for e in self._entries if e['status'] == 'pending']
+            failed = [e for e in self._entries if e['status'] == 'failed']
+            status = {'pending': len(pending), 'failed': len(failed),
+                      'errors': [(e['row']['date'], e['error']) for e in failed]}
+        error = self.storage.last_error
+        status.update(unsynced=self.storage.pending, sync_error=type(error).__name__ if error else None)
+        return status
+
+    def rows(self):
+        with self._cond:
+            return [dict(e['row']) for e in self._entries]
+
+    def overlay(self, df):
+        """`df` plus any entries not yet in storage, so unsaved entries show up immediately."""
+        rows = self.rows()
+        if df is None or not rows:
+            return df
+        known = set(pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'))
+        extra = [row for row in rows if row['date'] not in known]
+        if not extra:
+            return df
+        return pd.concat([df, pd.DataFrame(extra)], ignore_index=True)
+
+    def retry_failed(self):
+        with self._cond:
+            for entry in self._entries:
+                if entry['status'] == 'failed':
+                    entry.update(status='pending', attempts=0, next_try=0.0, error=None)
+            self._persist()
+            self._cond.notify()
+        self.storage.sync()
+
+    def discard_failed(self):
+        with self._cond:
+            self._entries = [e for e in self._entries if e['status'] != 'failed']
+            self._persist()
+
+    def _next_due(self, now):
+        due = [e for e in self._entries if e['status'] == 'pending' and not e['in_flight'] and e['next_try'] <= now]
+        return due[0] if due else None
+
+    def _wait_time(self, now):
+        waiting = [e['next_try'] - now for e in self._entries if e['status'] == 'pending' and not e['in_flight']]
+        return max(0.0, min(waiting)) if waiting else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                entry = self._next_due(time.time())
+                while entry is None:
+                    self._cond.wait(timeout=self._wait_time(time.time()))
+                    entry = self._next_due(time.time())
+                entry['in_flight'] = True
+            self._attempt(entry)
+
+    def _already_saved(self, row):
+        stored = self.storage.between(row['date'], row['date'])
+        if stored.empty:
+            return False
+        stored = stored.iloc[0]
+        return (float(stored['weight_lbs']) == row['weight_lbs']
+                and int(stored['food']) == row['food'] and int(stored['exer']) == row['exer'])
+
+    def _attempt(self, entry):
+        row = entry['row']
+        saved, error, permanent = False, None, False
+        try:
+            self.storage.append(row)
+            saved = True
+        except DuplicateDateError:
+            # Either an earlier attempt landed before we could record it, or the date
+            # was logged elsewhere with different values; only the former counts as saved.
+            try:
+                saved = self._already_saved(row)
+            except Exception as e:
+                error = type(e).__name__
+            if not saved and error is None:
+                error, permanent = f"An entry for {row['date']} already exists.", True
+        except Exception as e:
+            error = type(e).__name__
+        with self._cond:
+            entry['in_flight'] = False
+            if saved:
+                self._entries = [e for e in self._entries if e['id'] != entry['id']]
+            else:
+                entry['attempts'] += 1
+                entry['error'] = error
+                if permanent or entry['attempts'] >= self.max_attempts:
+                    entry['status'] = 'failed'
+                else:
+                    delay = min(self.max_delay, self.base_delay * 2 ** (entry['attempts'] - 1))
+                    entry['next_try'] = time.time() + delay * random.uniform(0.5, 1.5)
+            self._persist()
+        if saved and self.on_saved is not None:
+            self.on_saved()
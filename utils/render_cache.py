@@ -0,0 +1,32 @@
+import io
+
+from utils.instrument import timed
+from utils.lru import LRUCache
+
+# Encoded images, keyed by whatever determines the picture (data version, unit, weeks, size...).
+_CACHE = LRUCache(maxsize=32)
+
+# Same encoding st.pyplot uses, so cached images look identical to the old inline figures.
+SAVE_KWARGS = {'bbox_inches': 'tight', 'dpi': 200}
+
+
+def render(key, draw, fmt='png'):
+    """Return the encoded bytes for `key`, calling `draw()` for a new figure only on a miss."""
+    key = (fmt,) + tuple(key)
+    data = _CACHE.get(key)
+    if data is None:
+        import matplotlib.pyplot as plt
+        fig = draw()
+        try:
+            with timed('render.encode'):
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format=fmt, facecolor=fig.get_facecolor(), **SAVE_KWARGS)
+                data = buffer.getvalue()
+        finally:
+            plt.close(fig)
+        _CACHE.put(key, data)
+    return data
+
+
+def clear():
+    _CACHE.clear()
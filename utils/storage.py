@@ -0,0 +1,419 @@
+import io
+import json
+import os
+import queue
+import sqlite3
+import threading
+import tomllib
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from utils import local_cache
+from utils.feature_store import LBS_TO_KGS
+from utils.instrument import timed
+
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive"]
+# The original log on Google Drive, used wherever WEIGHT_STORAGE does not name another source.
+DRIVE_FILE_ID = '1P3JHnDkMMWf_xeGBaTHdEcAoYzTMIvU4'
+DEFAULT_SOURCE = os.environ.get('WEIGHT_STORAGE', DRIVE_FILE_ID)
+# Drive credentials for processes outside Streamlit (scripts, the API); the app reads st.secrets.
+SECRETS_PATH = Path(__file__).resolve().parent.parent / '.streamlit' / 'secrets.toml'
+COLUMNS = ['date', 'weight_lbs', 'exer', 'food', 'weight_kgs']
+
+
+class DuplicateDateError(ValueError):
+    pass
+
+
+def load_service_account_info():
+    with open(SECRETS_PATH, 'rb') as f:
+        return tomllib.load(f)['google_drive']
+
+
+class DrivePool:
+    """
+    Drive clients shared by every session and file in the process.
+
+    A googleapiclient service owns a single httplib2 connection, which is not safe to use
+    from two threads at once, so each request leases a client for its duration. Clients
+    are built lazily from one set of credentials, at most `size` at a time, and reused.
+    `service_account_info` may be a callable so that secrets are only read on first use.
+    """
+
+    def __init__(self, service_account_info, size=8):
+        self._info = service_account_info
+        self._credentials = None
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _build(self):
+        from google.oauth2.service_account import Credentials
+        from googleapiclient.discovery import build
+        with self._lock:
+            if self._credentials is None:
+                info = self._info() if callable(self._info) else self._info
+                self._credentials = Credentials.from_service_account_info(info, scopes=DRIVE_SCOPES)
+        return build("drive", "v3", credentials=self._credentials, cache_discovery=False)
+
+    @contextmanager
+    def lease(self):
+        with self._slots:
+            try:
+                service = self._idle.get_nowait()
+            except queue.Empty:
+                service = self._build()
+            yield service
+            # Skipped when the caller raised: that connection may be half-read, so it is dropped.
+            self._idle.put(service)
+
+
+def make_row(date, weight, food, exercise):
+    date = pd.to_datetime(date).strftime('%Y-%m-%d')
+    weight = float(weight)
+    return {'date': date, 'weight_lbs': weight, 'exer': int(exercise), 'food': int(food), 'weight_kgs': weight * LBS_TO_KGS}
+
+
+def _sorted(df):
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+    return df.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def _iso(date):
+    return pd.to_datetime(date).strftime('%Y-%m-%d')
+
+
+class Storage:
+    """
+    Where the log lives. Backends implement `read` and `write`; the other operations
+    default to whole-table scans and are overridden where the backend can do better.
+    """
+    # Writes accepted locally but not yet in the backing store, and why the last upload failed.
+    pending = 0
+    last_error = None
+
+    def read(self, stale_ok=True):
+        raise NotImplementedError
+
+    def write(self, df):
+        raise NotImplementedError
+
+    def append(self, row):
+        df = self.read(stale_ok=False)
+        if self._contains(df, row['date']):
+            raise DuplicateDateError(row['date'])
+        self.write(pd.concat([df, pd.DataFrame([row])], ignore_index=True))
+
+    def delete(self, dates):
+        df = self.read(stale_ok=False)
+        keep = ~pd.to_datetime(df['date']).isin(pd.to_datetime(list(dates)))
+        self.write(df[keep])
+
+    def exists(self, date):
+        return self._contains(self.read(), date)
+
+    def last_n(self, n):
+        return _sorted(self.read()).tail(n).iloc[::-1].reset_index(drop=True)
+
+    def between(self, start, end):
+        df = _sorted(self.read())
+        return df[(df['date'] >= _iso(start)) & (df['date'] <= _iso(end))].reset_index(drop=True)
+
+    def compact(self):
+        return
+
+    def sync(self):
+        """Start getting `pending` writes into the backing store now, without waiting."""
+        return
+
+    @staticmethod
+    def _contains(df, date):
+        return bool((pd.to_datetime(df['date']) == pd.to_datetime(date)).any())
+
+
+class DriveCSVStorage(Storage):
+    """The log as a single CSV file on Google Drive, fronted by the local Parquet cache."""
+
+    def __init__(self, file_id, pool):
+        self.file_id = file_id
+        self._pool = pool
+
+    @timed('drive.metadata')
+    def _meta(self):
+        with self._pool.lease() as service:
+            return service.files().get(fileId=self.file_id, fields=local_cache.META_FIELDS).execute()
+
+    def read(self, stale_ok=True):
+        from googleapiclient.http import MediaIoBaseDownload
+        try:
+            meta = self._meta()
+        except Exception:
+            # Offline or Drive unavailable: serve the last copy we have, even if stale.
+            if not stale_ok:
+                raise
+            return local_cache.load(self.file_id)
+        cached = local_cache.load(self.file_id, meta)
+        if cached is not None:
+            return cached
+        fh = io.BytesIO()
+        with timed('drive.download'), self._pool.lease() as service:
+            downloader = MediaIoBaseDownload(fh, service.files().get_media(fileId=self.file_id))
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+        fh.seek(0)
+        with timed('csv.parse'):
+            df = pd.read_csv(fh)
+        local_cache.save(self.file_id, meta, df)
+        return df
+
+    def write(self, df):
+        from googleapiclient.http import MediaIoBaseUpload
+        buffer = io.StringIO()
+        _sorted(df).to_csv(buffer, index=False)
+        payload = buffer.getvalue().encode()
+        media = MediaIoBaseUpload(io.BytesIO(payload), mimetype='text/csv')
+        with timed('drive.upload'), self._pool.lease() as service:
+            meta = service.files().update(fileId=self.file_id, media_body=media, fields=local_cache.META_FIELDS).execute()
+        # Seed the local cache with what we just uploaded so the next read skips the download.
+        local_cache.save(self.file_id, meta, pd.read_csv(io.BytesIO(payload)))
+
+
+class LocalCSVStorage(Storage):
+    """The log as a CSV file on local disk, e.g. data/weight.csv; appends add one line."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, stale_ok=True):
+        return pd.read_csv(self.path)
+
+    def write(self, df):
+        tmp = f'{self.path}.tmp'
+        _sorted(df).to_csv(tmp, index=False)
+        os.replace(tmp, self.path)
+
+    def append(self, row):
+        if not os.path.exists(self.path):
+            self.write(pd.DataFrame([row], columns=COLUMNS))
+            return
+        if self.exists(row['date']):
+            raise DuplicateDateError(row['date'])
+        with open(self.path, 'r') as f:
+            header = f.readline().strip().split(',')
+        line = pd.DataFrame([row]).reindex(columns=header).to_csv(index=False, header=False)
+        with open(self.path, 'a') as f:
+            f.write(line)
+
+
+class SQLiteStorage(Storage):
+    """
+    The log in a SQLite table keyed by `date`. Duplicate checks, range queries and
+    deletes go through the primary-key index instead of scanning the whole table.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS log ('
+                'date TEXT PRIMARY KEY, weight_lbs REAL NOT NULL, exer INTEGER NOT NULL, '
+                'food INTEGER NOT NULL, weight_kgs REAL) WITHOUT ROWID'
+            )
+
+    def _connect(self):
+        # One short-lived connection per call keeps the backend safe to share across session threads.
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _query(self, sql, params=()):
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def read(self, stale_ok=True):
+        return self._query(f'SELECT {", ".join(COLUMNS)} FROM log ORDER BY date')
+
+    def write(self, df):
+        rows = _sorted(df).reindex(columns=COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM log')
+            conn.executemany('INSERT INTO log VALUES (?, ?, ?, ?, ?)', rows.itertuples(index=False, name=None))
+
+    def append(self, row):
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('INSERT INTO log VALUES (?, ?, ?, ?, ?)', [row[col] for col in COLUMNS])
+        except sqlite3.IntegrityError:
+            raise DuplicateDateError(row['date'])
+
+    def delete(self, dates):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany('DELETE FROM log WHERE date = ?', [(_iso(d),) for d in dates])
+
+    def exists(self, date):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT 1 FROM log WHERE date = ?', (_iso(date),)).fetchone() is not None
+
+    def last_n(self, n):
+        return self._query(f'SELECT {", ".join(COLUMNS)} FROM log ORDER BY date DESC LIMIT ?', (int(n),))
+
+    def between(self, start, end):
+        return self._query(f'SELECT {", ".join(COLUMNS)} FROM log WHERE date BETWEEN ? AND ? ORDER BY date', (_iso(start), _iso(end)))
+
+
+class JournaledStorage(Storage):
+    """
+    Append-only write path in front of a full-file backend.
+
+    Each `append`/`delete` is one JSON line in a local write-ahead journal, so a save
+    costs a few hundred bytes regardless of history length; like the other backends,
+    `append` refuses a date that is already logged. Reads replay the journal
+    over the base file. The journal is folded into the base file with a single rewrite
+    on a background thread `compact_delay` seconds after the last write (at once when
+    `compact_every` operations are waiting); failed rewrites are retried with exponential
+    backoff up to `max_delay`. `pending` and `last_error` report what has not reached
+    the base file yet.
+    """
+
+    def __init__(self, base, journal_path, compact_every=30, compact_delay=10.0, max_delay=600.0):
+        self.base = base
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.compact_delay = compact_delay
+        self.max_delay = max_delay
+        self.last_error = None
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._timer = None
+        self._timer_lock = threading.Lock()
+        # Operations journaled before a restart are uploaded without waiting for a new write.
+        if os.path.exists(journal_path) and self.pending:
+            self._schedule(compact_delay)
+
+    def _read_ops(self):
+        try:
+            with open(self.journal_path, 'r') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _write_op(self, op, unique=False):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        with self._lock:
+            # Checked against the current base file, not a cached copy: the date may have been
+            # logged from another device. Compaction drops ops under this lock, so none is missed.
+            if unique and self._contains(self._apply(self.base.read(stale_ok=False), self._read_ops()), op['date']):
+                raise DuplicateDateError(op['date'])
+            with open(self.journal_path, 'a') as f:
+                f.write(json.dumps(op) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            pending = len(self._read_ops())
+        if pending >= self.compact_every:
+            self._schedule(0)
+        elif not self.failures:
+            # Debounced: a burst of saves is uploaded once. While retrying, the backoff stands.
+            self._schedule(self.compact_delay)
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._read_ops())
+
+    @staticmethod
+    def _apply(df, ops):
+        latest = {}
+        for op in ops:
+            latest[op['date']] = op.get('row') if op['op'] == 'put' else None
+        if not latest:
+            return df
+        dates = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        df = df[~dates.isin(list(latest))]
+        puts = [row for row in latest.values() if row is not None]
+        if puts:
+            df = pd.concat([df, pd.DataFrame(puts)], ignore_index=True)
+        return _sorted(df)
+
+    def read(self, stale_ok=True):
+        df = self.base.read(stale_ok=stale_ok)
+        if df is None:
+            return None
+        with self._lock:
+            ops = self._read_ops()
+        return self._apply(df, ops)
+
+    def append(self, row):
+        self._write_op({'op': 'put', 'date': row['date'], 'row': row}, unique=True)
+
+    def delete(self, dates):
+        for date in dates:
+            self._write_op({'op': 'delete', 'date': _iso(date)})
+
+    def write(self, df):
+        with self._compact_lock:
+            self.base.write(df)
+            with self._lock:
+                self._drop(len(self._read_ops()))
+
+    def _drop(self, n):
+        remaining = self._read_ops()[n:]
+        tmp = f'{self.journal_path}.tmp'
+        with open(tmp, 'w') as f:
+            f.writelines(json.dumps(op) + '\n' for op in remaining)
+        os.replace(tmp, self.journal_path)
+
+    def compact(self):
+        with self._compact_lock:
+            with self._lock:
+                ops = self._read_ops()
+            if ops:
+                self.base.write(self._apply(self.base.read(stale_ok=False), ops))
+                # Operations journaled while the upload was running stay for the next round.
+                with self._lock:
+                    self._drop(len(ops))
+            self.last_error = None
+            self.failures = 0
+
+    def sync(self):
+        self._schedule(0)
+
+    def _schedule(self, delay):
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._compact_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            self.last_error = e
+            self.failures += 1
+            self._schedule(min(self.max_delay, self.compact_delay * 2 ** self.failures))
+            return
+        if self.pending:
+            self._schedule(self.compact_delay)
+
+
+def open_storage(source, drive_pool=None, journal_dir=local_cache.CACHE_DIR):
+    """
+    Open a backend from a source string: `csv://path`, `sqlite://path`, `drive://<file id>`
+    or a bare Drive file id. Drive files get the local journal in front of them; without a
+    `drive_pool` their credentials are read from .streamlit/secrets.toml (scripts, the API).
+    """
+    scheme, _, target = source.rpartition('://')
+    if scheme == 'csv':
+        return LocalCSVStorage(target)
+    if scheme == 'sqlite':
+        return SQLiteStorage(target)
+    if scheme in ('', 'drive'):
+        if drive_pool is None:
+            drive_pool = DrivePool(load_service_account_info, size=1)
+        journal_path = os.path.join(journal_dir, f'{target}.journal.jsonl')
+        return JournaledStorage(DriveCSVStorage(target, drive_pool), journal_path)
+    raise ValueError(f"Unknown storage scheme '{scheme}' in {source}.")
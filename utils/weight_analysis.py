@@ -1,13 +1,14 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import streamlit as st
-from sklearn.preprocessing import MinMaxScaler
-import json
-import io
+import hashlib
+import os
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+from utils import local_cache, lod, render_cache
+from utils.instrument import timed
+from utils.forecast import BAD_SCORE, GOOD_SCORE, build_forecast, load_params, score, weekly_gain
+from utils.outbox import Outbox
+from utils.feature_store import FeatureStore, compact, signature
+from utils.storage import DrivePool, DuplicateDateError, make_row, open_storage
 
 _PALETTE = {
     'weight':      '#4C72B0',  # steel blue    — raw weight line
@@ -25,105 +26,143 @@ _PALETTE = {
     'fc_good':     '#8172B2',  # violet        — good scenario
 }
 
+# Goal weight and the half-width of the goal band, per unit.
+GOALS = {'lbs': (147.7097157, 2.2), 'kgs': (67, 1)}
+
+# Bounds for per-file state shared by all sessions; least recently used files are evicted first.
+MAX_CACHED_FILES = 16
+DRIVE_POOL_SIZE = 8
+
 @st.cache_resource
-def get_drive_service():
-    service_account_info = st.secrets["google_drive"]
-    credentials = Credentials.from_service_account_info(service_account_info, scopes=["https://www.googleapis.com/auth/drive"])
-    return build("drive", "v3", credentials=credentials)
+def get_drive_pool():
+    return DrivePool(lambda: st.secrets["google_drive"], size=DRIVE_POOL_SIZE)
 
-@st.cache_data(ttl=300)
-def read_csv_from_drive(file_id):
-    try:
-        request = get_drive_service().files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
+# Not evicted: the outbox keeps its storage, and a second instance for the same source would
+# race it on the journal file. Storage objects are small; the bounded caches are read_log and renders.
+@st.cache_resource
+def get_storage(source):
+    return open_storage(source, drive_pool=get_drive_pool())
 
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
+@st.cache_resource
+def get_outbox(source):
+    # One outbox and worker per source for the whole process; not evicted, so two workers never race on a file.
+    name = hashlib.sha1(source.encode()).hexdigest()[:16]
+    path = str(local_cache.CACHE_DIR / f'{name}.outbox.json')
+    return Outbox(get_storage(source), path, on_saved=lambda: read_log.clear(source))
 
-        fh.seek(0)
-        return pd.read_csv(fh)
+# A resource rather than data: every rerun gets the same frame instead of an unpickled copy,
+# and its signature is computed once per download. Callers must not modify the frame.
+@st.cache_resource(ttl=300, max_entries=MAX_CACHED_FILES)
+@timed('read_log.miss')
+def read_log(source):
+    """(signature, log) for `source`, or None if it could not be read."""
+    try:
+        df = compact(get_storage(source).read())
     except Exception as e:
         return None
+    return None if df is None else (signature(df), df)
+
+def _day_key(date):
+    return None if date is None else pd.Timestamp(date).strftime('%Y-%m-%d')
 
 class wana:
-    def __init__(self, file_id, raw_df, measurement='lbs', param='forecast_model/model_parameters_reg_prod.json'):
+    @timed('wana.__init__')
+    def __init__(self, file_id, raw_df, measurement='lbs', param='forecast_model/model_parameters_reg_prod.json', storage=None, outbox=None,
+                 arima_param='forecast_model/model_parameters_arima.json', impute=None):
         self.file_id = file_id
         self.param = param
-        self.measurement = measurement
-        df = raw_df.copy()
-        df.index = pd.to_datetime(df['date'])
-        self.raw_df = df
-        df['weight_kgs'] = df['weight_lbs'] * 0.453592
-        df = df.drop(['date'], axis=1)
-        df = df.sort_index()
-        if self.measurement=='kgs':
-            self.weight_col = 'weight_kgs'
-            self.weight_goal = 67
-            self.weight_goal_band = 1
-            self.weight_min = df['weight_kgs'].min()
-        else:
-            self.weight_col = 'weight_lbs'
-            self.weight_goal = 147.7097157
-            self.weight_goal_band = 2.2
-            self.weight_min = df['weight_lbs'].min()
-        for col in ['weight_lbs', 'weight_kgs', 'food', 'exer']:
-            df[f'{col}_avg_7d'] = df[col].rolling(window=7).mean()
-        for col in ['weight_lbs', 'weight_kgs', 'food', 'exer']:
-            df[f'{col}_std_21d'] = df[col].rolling(window=21).std()
-        scaler = MinMaxScaler()
-        for col in ['food_avg_7d','exer_avg_7d']:
-            df[col] = scaler.fit_transform(df[col].values.reshape(-1, 1))
-        df['food_exercise_avg_7d'] = 0.7*df['food_avg_7d'] + 0.3*df['exer_avg_7d']
-        self.df = df
-        self.today = pd.Timestamp.now(tz='America/New_York').normalize().tz_localize(None)
-        self.last_weight = df['weight_lbs'].iloc[-1]
-    
+        self.arima_param = arima_param
+        self.storage = storage if storage is not None else get_storage(file_id)
+        self.outbox = outbox
+        self._forecast = None
+        self.store = FeatureStore(raw_df, impute=impute)
+        self.change_measurement(measurement)
+
+    @property
+    def today(self):
+        return pd.Timestamp.now(tz='America/New_York').normalize().tz_localize(None)
+
+    @property
+    def df(self):
+        return self.store.frame()
+
+    @property
+    def raw_df(self):
+        return self.store.raw()
+
+    @property
+    def last_weight(self):
+        return self.store.last('weight_lbs')
+
+    @property
+    def version(self):
+        return (self.file_id, self.store.signature, self.store.impute)
+
+    def matches(self, file_id, log_signature):
+        return self.file_id == file_id and self.store.signature == log_signature
+
     def last_n(self, n):
-        df_n = self.df.sort_index(ascending=False).head(n)
+        # Filled-in days only feed the rolling features; they are not entries.
+        df_n = self.df[~self.store.imputed()].iloc[::-1].head(n)
         output = df_n[[self.weight_col, 'food', 'exer', f'{self.weight_col}_avg_7d',  'food_avg_7d', 'exer_avg_7d']]
         return output
 
     def change_measurement(self, measurement):
         self.measurement = measurement
         self.weight_col = 'weight_kgs' if measurement == 'kgs' else 'weight_lbs'
-        self.weight_goal = 67 if measurement == 'kgs' else 147.7097157
-        self.weight_goal_band = 1 if measurement == 'kgs' else 2.2
-        self.weight_min = self.df['weight_kgs'].min() if measurement == 'kgs' else self.df['weight_lbs'].min()
+        self.weight_goal, self.weight_goal_band = GOALS['kgs' if measurement == 'kgs' else 'lbs']
+        self.weight_min = self.store.min(self.weight_col)
         return
     
+    @timed('wana.find_missing')
     def find_missing(self):
-        today = self.today
-        full_date_range = pd.date_range(start=self.df.index.min(), end=today, freq='D')
-        missing_dates = full_date_range.difference(self.df.index)
-        return missing_dates
+        return self.store.missing_dates(until=self.today)
+
+    def missing_ranges(self):
+        """Missing dates up to today as (first, last) ranges, from the store's gap index."""
+        return self.store.gaps(until=self.today)
+
+    def has_entries(self, start=None, end=None):
+        """Whether any row of the store falls between `start` and `end` (inclusive, either may be None)."""
+        dates = self.store.dates()
+        lo = 0 if start is None else dates.searchsorted(pd.Timestamp(start))
+        hi = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), side='right')
+        return hi > lo
+
+    @timed('wana.plot')
+    def plot(self, figsize=(14, 20), start=None, end=None, max_points=lod.MAX_POINTS):
+        import matplotlib.pyplot as plt
+        df = lod.view(self.df, start, end)
+        if df.empty:
+            raise ValueError(f"No entries between {_day_key(start)} and {_day_key(end)}.")
+
+        def line(col, method='mean'):
+            return lod.downsample(df[col], max_points=max_points, method=method)
 
-    def plot(self):
         with plt.style.context('dark_background'):
-            fig, (ax1, ax2, ax3, ax4) = plt.subplots(nrows=4, ncols=1, figsize=(14, 20), sharex=True)
+            fig, (ax1, ax2, ax3, ax4) = plt.subplots(nrows=4, ncols=1, figsize=figsize, sharex=True)
             fig.patch.set_facecolor('#0E1117')
             for ax in (ax1, ax2, ax3, ax4):
                 ax.set_facecolor('#1C2231')
 
-            ax1.plot(self.df.index, self.df[self.weight_col], label=f'Weight ({self.measurement})', color=_PALETTE['weight'], linewidth=1.5, alpha=0.6)
-            ax1.plot(self.df.index, self.df[f'{self.weight_col}_avg_7d'], label='7-day Avg', color=_PALETTE['avg_7d'], linewidth=2.5)
-            x_end = self.df.index[-1] + pd.Timedelta(weeks=2)
-            ax1.fill_between([self.df.index[0], x_end], self.weight_goal - self.weight_goal_band, self.weight_goal + self.weight_goal_band, color=_PALETTE['goal_band'], alpha=0.2, label='Goal range')
+            ax1.plot(*line(self.weight_col, method='lttb'), label=f'Weight ({self.measurement})', color=_PALETTE['weight'], linewidth=1.5, alpha=0.6)
+            ax1.plot(*line(f'{self.weight_col}_avg_7d'), label='7-day Avg', color=_PALETTE['avg_7d'], linewidth=2.5)
+            x_end = df.index[-1] + pd.Timedelta(weeks=2)
+            ax1.fill_between([df.index[0], x_end], self.weight_goal - self.weight_goal_band, self.weight_goal + self.weight_goal_band, color=_PALETTE['goal_band'], alpha=0.2, label='Goal range')
             ax1.axhline(y=self.weight_min, color=_PALETTE['min_line'], linestyle=':', linewidth=1.5, label='Personal min')
             ax1.set_ylabel(f'Weight ({self.measurement})', fontsize=12)
             ax1.set_title('Weight Trends', fontsize=14, fontweight='semibold')
 
-            ax2.plot(self.df.index, self.df['food_exercise_avg_7d'], label='Food & Exercise (7-day Avg)', color=_PALETTE['combined'], linewidth=2.5)
+            ax2.plot(*line('food_exercise_avg_7d'), label='Food & Exercise (7-day Avg)', color=_PALETTE['combined'], linewidth=2.5)
             ax2.set_ylabel('Food & Exercise Averaged', fontsize=12)
             ax2.set_title('Food and Exercise Average Trends', fontsize=14, fontweight='semibold')
 
-            ax3.plot(self.df.index, self.df['food_avg_7d'], label='Food (7-day Avg)', color=_PALETTE['food'], linewidth=2.5)
-            ax3.plot(self.df.index, self.df['exer_avg_7d'], label='Exercise (7-day Avg)', color=_PALETTE['exercise'], linewidth=2.5)
+            ax3.plot(*line('food_avg_7d'), label='Food (7-day Avg)', color=_PALETTE['food'], linewidth=2.5)
+            ax3.plot(*line('exer_avg_7d'), label='Exercise (7-day Avg)', color=_PALETTE['exercise'], linewidth=2.5)
             ax3.set_ylabel('Food & Exercise (scaled)', fontsize=12)
             ax3.set_title('Food and Exercise Trends', fontsize=14, fontweight='semibold')
 
-            ax4.plot(self.df.index, self.df[f'{self.weight_col}_std_21d'], label='21-day Std Dev', color=_PALETTE['std'], linewidth=2.5)
+            ax4.plot(*line(f'{self.weight_col}_std_21d'), label='21-day Std Dev', color=_PALETTE['std'], linewidth=2.5)
             ax4.set_ylabel('Weight Standard Deviation', fontsize=12)
             ax4.set_title('Weight Volatility (21-day Std Dev)', fontsize=14, fontweight='semibold')
 
@@ -136,68 +175,86 @@ class wana:
             plt.tight_layout()
             return fig
     
+    @timed('wana.update_data')
     def update_data(self, date, weight, food, exercise):
-        if pd.to_datetime(date) in self.raw_df.index:
-            return f"Date {date} already exists in the data. No update performed."
-        temp = pd.DataFrame({'date': [date], 'weight_lbs': [weight], 'exer': [exercise], 'food': [food]})
-        temp.index = pd.to_datetime(temp['date'])
-        df = pd.concat([self.raw_df, temp])
-        df = df.sort_index()
-        buffer = io.StringIO()
-        df.to_csv(buffer, index=False)
-        buffer.seek(0)
-
-        media = MediaIoBaseUpload(io.BytesIO(buffer.getvalue().encode()), mimetype='text/csv')
-        try:
-            get_drive_service().files().update(fileId=self.file_id, media_body=media).execute()
-        except Exception as e:
-            return f"Failed to save data to Drive: {type(e).__name__}"
-        self.raw_df = df
+        exists_msg = f"Date {date} already exists in the data. No update performed."
+        if self.store.contains(date):
+            return exists_msg
+        row = make_row(date, weight, food, exercise)
+        if self.outbox is not None:
+            # Saved locally; the outbox worker delivers it to storage in the background.
+            self.outbox.submit(row)
+        else:
+            try:
+                self.storage.append(row)
+            except DuplicateDateError:
+                return exists_msg
+            except Exception as e:
+                return f"Failed to save data: {type(e).__name__}"
+        if self.store.can_append(date):
+            self.store.append(date, weight, food, exercise)
+        else:
+            self.store.rebuild(pd.concat([self.store.raw(), compact(pd.DataFrame([row]))], ignore_index=True))
         return "Table Updated"
     
     def estimate_gain_weight(self):
-        with open(self.param, 'r') as f:
-            param = json.load(f)
-        last_week_food = self.df['food'].tail(7).mean()
-        last_week_exer = self.df['exer'].tail(7).sum()
-        last_week_food_n = (last_week_food - param['food_min']) / param['food_range']
-        last_week_exer_n = (last_week_exer - param['exer_min']) / param['exer_range']
-        weighted_average = param['w1']*last_week_exer_n + (1-param['w1'])*last_week_food_n
-        weight_gain_expected = param['intercept']+param['slope']*weighted_average
-        weight_gain_bad = param['intercept']+param['slope']*0.1
-        weight_gain_good = param['intercept']+param['slope']*0.9
+        param = load_params(self.param)
+        last_week_food = self.store.values('food')[-7:].mean()
+        last_week_exer = self.store.values('exer')[-7:].sum()
+        weighted_average = score(param, last_week_food, last_week_exer)
+        weight_gain_expected, weight_gain_bad, weight_gain_good = weekly_gain(param, [weighted_average, BAD_SCORE, GOOD_SCORE])
         return weight_gain_expected, weight_gain_bad, weight_gain_good
-    
-    def forecast_graph(self, num_weeks):
-        weight_gain_expected, weight_gain_bad, weight_gain_good = self.estimate_gain_weight()
-        if self.measurement=='kgs':
-            weight_gain_expected = weight_gain_expected * 0.453592
-            weight_gain_bad = weight_gain_bad * 0.453592
-            weight_gain_good = weight_gain_good * 0.453592
-        last_date = self.df.index[-1]
-        future_date = last_date + pd.Timedelta(weeks=num_weeks)
-        last_weight = self.df[f'{self.weight_col}_avg_7d'].iloc[-1]
-        future_weight_expected = last_weight + (weight_gain_expected * num_weeks)
-        future_weight_bad = last_weight + (weight_gain_bad * num_weeks)
-        future_weight_good = last_weight + (weight_gain_good * num_weeks)
-        interpolation_df = pd.DataFrame({
-                'date': [last_date, future_date],
-                'weight_gain_expected': [last_weight, future_weight_expected],
-                'weight_gain_bad': [last_weight, future_weight_bad],
-                'weight_gain_good': [last_weight, future_weight_good]
-            }).set_index('date')
-        interpolated_df = interpolation_df.resample('D').interpolate()
+
+    def forecast_key(self, mode, measurement=None):
+        param = self.arima_param if mode == 'arima' else self.param
+        return (mode, self.version, measurement or self.measurement, param, os.path.getmtime(param))
+
+    @timed('wana.forecast')
+    def forecast(self, mode='regression', measurement=None):
+        """Forecast in `measurement` (default: the current unit), which leaves the unit unchanged."""
+        measurement = measurement or self.measurement
+        key = self.forecast_key(mode, measurement)
+        if self._forecast is None or self._forecast[0] != key:
+            if mode == 'arima':
+                from utils.arima import build_arima_forecast, load_spec
+                fc = build_arima_forecast(self.file_id, self.store, load_spec(self.arima_param), measurement)
+            else:
+                fc = build_forecast(self.store, load_params(self.param), measurement)
+            self._forecast = (key, fc)
+        return self._forecast[1]
+
+    def plot_image(self, fmt='png', figsize=(14, 20), start=None, end=None):
+        key = ('plot', self.version, self.measurement, figsize, _day_key(start), _day_key(end))
+        return render_cache.render(key, lambda: self.plot(figsize=figsize, start=start, end=end), fmt=fmt)
+
+    def forecast_image(self, num_weeks, fmt='png', figsize=(14, 5), mode='regression'):
+        key = ('forecast', num_weeks, figsize) + self.forecast_key(mode)
+        return render_cache.render(key, lambda: self.forecast_graph(num_weeks, figsize=figsize, mode=mode), fmt=fmt)
+
+    @timed('wana.forecast_graph')
+    def forecast_graph(self, num_weeks, figsize=(14, 5), mode='regression'):
+        fc = self.forecast(mode)
+        dates, values = fc.horizon(num_weeks)
+        interpolated_df = pd.DataFrame(dict(zip(fc.labels, values)), index=dates).rename(columns={
+                'expected': 'weight_gain_expected', 'bad': 'weight_gain_bad', 'good': 'weight_gain_good'})
+        future_date = dates[-1]
+        future_weight_expected, future_weight_bad, future_weight_good = interpolated_df[['weight_gain_expected', 'weight_gain_bad', 'weight_gain_good']].iloc[-1]
+        history = pd.Series(self.store.avg(self.weight_col), index=self.store.dates())
+        import matplotlib.pyplot as plt
         with plt.style.context('dark_background'):
-            fig, ax = plt.subplots(figsize=(14, 5))
+            fig, ax = plt.subplots(figsize=figsize)
             fig.patch.set_facecolor('#0E1117')
             ax.set_facecolor('#1C2231')
-            ax.plot(self.df.index, self.df[f'{self.weight_col}_avg_7d'], label=f'Weight {self.measurement} Avg (7d)', color=_PALETTE['avg_7d'], linewidth=2.5)
+            ax.plot(*lod.downsample(history), label=f'Weight {self.measurement} Avg (7d)', color=_PALETTE['avg_7d'], linewidth=2.5)
             ax.plot(interpolated_df.index, interpolated_df['weight_gain_expected'], label='Expected', linestyle='--', color=_PALETTE['fc_expected'], linewidth=2)
             ax.plot(interpolated_df.index, interpolated_df['weight_gain_bad'], label='Pessimistic', linestyle='--', color=_PALETTE['fc_bad'], linewidth=2)
             ax.plot(interpolated_df.index, interpolated_df['weight_gain_good'], label='Optimistic', linestyle='--', color=_PALETTE['fc_good'], linewidth=2)
-            ax.fill_between(interpolated_df.index, interpolated_df['weight_gain_bad'], interpolated_df['weight_gain_good'], alpha=0.08, color=_PALETTE['fc_expected'], label='_nolegend_')
+            if 'lower' in interpolated_df:
+                ax.fill_between(interpolated_df.index, interpolated_df['lower'], interpolated_df['upper'], alpha=0.12, color=_PALETTE['fc_expected'], label='95% interval')
+            else:
+                ax.fill_between(interpolated_df.index, interpolated_df['weight_gain_bad'], interpolated_df['weight_gain_good'], alpha=0.08, color=_PALETTE['fc_expected'], label='_nolegend_')
             x_end = future_date + pd.Timedelta(weeks=4)
-            ax.fill_between([self.df.index[0], x_end], self.weight_goal - self.weight_goal_band, self.weight_goal + self.weight_goal_band, color=_PALETTE['goal_band'], alpha=0.2, label='_nolegend_')
+            ax.fill_between([history.index[0], x_end], self.weight_goal - self.weight_goal_band, self.weight_goal + self.weight_goal_band, color=_PALETTE['goal_band'], alpha=0.2, label='_nolegend_')
             ax.axhline(y=self.weight_min, color=_PALETTE['min_line'], linestyle=':', linewidth=1.5, label='Personal min')
             ax.set_xlim(right=x_end)
             ax.text(future_date, future_weight_expected, f'{future_weight_expected:.2f}', color=_PALETTE['fc_expected'], fontsize=10, ha='left', fontweight='semibold')
@@ -205,7 +262,7 @@ class wana:
             ax.text(future_date, future_weight_good, f'{future_weight_good:.2f}', color=_PALETTE['fc_good'], fontsize=10, ha='left', fontweight='semibold')
             ax.set_xlabel('Date', fontsize=12)
             ax.set_ylabel(f'Weight ({self.measurement})', fontsize=12)
-            ax.set_title('Weight Forecast', fontsize=14, fontweight='semibold')
+            ax.set_title('Weight Forecast (ARIMA)' if mode == 'arima' else 'Weight Forecast', fontsize=14, fontweight='semibold')
             ax.legend(loc='upper right', fontsize=10, framealpha=0.3)
             ax.spines[['top', 'right']].set_visible(False)
             ax.grid(color='#2A3347', linewidth=0.8)
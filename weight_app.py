@@ -1,10 +1,17 @@
 import datetime
+import os
 import pandas as pd
 import streamlit as st
-from utils.weight_analysis import wana, read_csv_from_drive
+from utils import instrument
+from utils.instrument import timed
+from utils.feature_store import signature
+from utils.storage import DEFAULT_SOURCE
+from utils.weight_analysis import GOALS, wana, read_log, get_outbox
 from components.log_form import log_form
+from components.weight_chart import weight_chart
 
 st.set_page_config(page_title='Weight Control', layout="centered")
+instrument.start_rerun()
 
 st.markdown("""
 <style>
@@ -21,22 +28,110 @@ st.markdown("""
 
 st.title('Weight Control')
 
-FILE_ID = '1P3JHnDkMMWf_xeGBaTHdEcAoYzTMIvU4'
+def load_datasets():
+    # Several people can share one instance, each signed in (st.login, configured under [auth])
+    # and seeing only the logs that list their email in secrets.toml:
+    #   [datasets.Alice]
+    #   source = "<drive file id>"
+    #   users = ["alice@example.com"]
+    #   [datasets.Bob]
+    #   source = "sqlite://data/bob.db"
+    #   users = ["bob@example.com"]
+    # Without that section the single log comes from WEIGHT_STORAGE (e.g. csv://data/weight.csv
+    # or sqlite://data/weight.db to run offline) or the original Drive file.
+    try:
+        configured = st.secrets.get('datasets', {})
+    except Exception:
+        configured = {}
+    return {name: dict(spec) for name, spec in configured.items()}
+
+def user_datasets(datasets):
+    """Name -> source of the logs the signed-in user may open; the single default log if none are configured."""
+    if not datasets:
+        return {'My log': DEFAULT_SOURCE}
+    if not st.user.get('is_logged_in'):
+        st.info("Sign in to open your log.")
+        st.button("Sign in", on_click=st.login)
+        st.stop()
+    email = (st.user.get('email') or '').lower()
+    allowed = {name: spec['source'] for name, spec in datasets.items()
+               if email in [user.lower() for user in spec.get('users', [])]}
+    if not allowed:
+        st.error(f"No log is shared with {email or 'this account'}.")
+        st.button("Sign out", on_click=st.logout)
+        st.stop()
+    return allowed
+
+DATASETS = user_datasets(load_datasets())
 
 with st.sidebar:
+    names = list(DATASETS)
+    if len(names) > 1:
+        requested = st.query_params.get('dataset')
+        dataset = st.selectbox('Dataset', names, index=names.index(requested) if requested in names else 0, key='dataset')
+        st.query_params['dataset'] = dataset
+    else:
+        dataset = names[0]
+    SOURCE = DATASETS[dataset]
     if st.button('Refresh Data'):
-        read_csv_from_drive.clear()
+        read_log.clear(SOURCE)
         st.rerun()
+    # Fill gaps of a few days (interpolated weight) so the rolling averages run over whole days.
+    impute = 'interpolate' if st.toggle('Fill short gaps', key='impute', help='Interpolate up to 3 missing days for the averages') else None
+    show_timings = st.toggle('Show timings', key='show_timings')
+    timing_panel = st.container()
+
+outbox = get_outbox(SOURCE)
+
+@st.fragment(run_every=5)
+def save_status():
+    status = outbox.status()
+    # Entries saved on this host but not yet uploaded (e.g. the Drive journal) count as syncing.
+    syncing = status['pending'] + status['unsynced']
+    if syncing:
+        st.caption(f"⏳ Syncing {syncing} entr{'y' if syncing == 1 else 'ies'}…")
+    if status['sync_error']:
+        st.warning(f"Upload failing ({status['sync_error']}); retrying in the background.", icon="⚠️")
+    if status['failed']:
+        st.warning(f"{status['failed']} entr{'y' if status['failed'] == 1 else 'ies'} not saved yet.", icon="⚠️")
+        for date, error in status['errors']:
+            st.caption(f"{date}: {error}")
+    if status['failed'] or status['sync_error']:
+        retry, discard = st.columns(2)
+        if retry.button('Retry', key='outbox_retry'):
+            outbox.retry_failed()
+            st.rerun(scope="fragment")
+        if status['failed'] and discard.button('Discard', key='outbox_discard'):
+            outbox.discard_failed()
+            st.rerun(scope="app")
 
-raw_df = read_csv_from_drive(FILE_ID)
-if raw_df is None:
-    st.error("Could not load data from Google Drive. Check your connection and credentials.")
+with st.sidebar:
+    save_status()
+
+with timed('read_log'):
+    log = read_log(SOURCE)
+if log is None:
+    st.error("Could not load data. Check your connection, credentials and storage settings.")
     st.stop()
+log_signature, stored = log
+# Entries still in the outbox are shown as if saved; only then is the signature recomputed.
+raw_df = outbox.overlay(stored)
+if raw_df is not stored:
+    log_signature = signature(raw_df)
 measurement = st.session_state.get('measurement', 'lbs')
-analysis = wana(FILE_ID, raw_df, measurement=measurement)
+# Keep the feature store across reruns; only rebuild when the downloaded log differs from it.
+analysis = st.session_state.get('analysis')
+if analysis is None or not analysis.matches(SOURCE, log_signature) or analysis.store.impute != impute:
+    analysis = wana(SOURCE, raw_df, measurement=measurement, outbox=outbox, impute=impute)
+    st.session_state['analysis'] = analysis
+elif analysis.measurement != measurement:
+    analysis.change_measurement(measurement)
 
 st.segmented_control("Unit", options=['lbs', 'kgs'], key='measurement', default='lbs')
 
+# Analysis chart presets: how far back from the last entry to show (None: everything).
+PLOT_RANGES = {'3M': datetime.timedelta(days=91), '1Y': datetime.timedelta(days=365), '5Y': datetime.timedelta(days=5 * 365), 'All': None}
+
 tab1, tab2, tab3, tab4 = st.tabs(['Log', 'Analysis', 'Forecast', 'Data'])
 
 @st.fragment
@@ -44,15 +139,18 @@ def input_tab():
     # Log tab always uses lbs
     last_weight = round(float(analysis.last_weight), 1)
 
-    last_food     = int(analysis.df['food'].iloc[-1]) if not analysis.df.empty else 5
-    last_exercise = bool(analysis.df['exer'].iloc[-1]) if not analysis.df.empty else False
-    existing_dates = analysis.df.index.strftime("%Y-%m-%d").tolist()
-
-    missing = analysis.find_missing()
-    if len(missing) > 0:
-        with st.expander(f"⚠️ {len(missing)} missing date(s)"):
-            for m in missing:
-                st.markdown(f"- {m.date()}")
+    store = analysis.store
+    last_food     = int(store.last('food')) if len(store) else 5
+    last_exercise = bool(store.last('exer')) if len(store) else False
+    existing_dates = store.dates()[~store.imputed()].strftime("%Y-%m-%d").tolist()
+
+    gaps = analysis.missing_ranges()
+    if gaps:
+        total = sum((last - first).days + 1 for first, last in gaps)
+        with st.expander(f"⚠️ {total} missing date(s) in {len(gaps)} gap(s)"):
+            for first, last in reversed(gaps):
+                days = (last - first).days + 1
+                st.markdown(f"- {first.date()}" if days == 1 else f"- {first.date()} → {last.date()} ({days} days)")
     else:
         st.success("No missing dates.", icon="✅")
 
@@ -78,7 +176,6 @@ def input_tab():
             bool(result["exercise"]),
         )
         if update_result == "Table Updated":
-            read_csv_from_drive.clear()
             del st.session_state["log_form"]
             st.toast("Saved!", icon="✅")
             st.rerun(scope="app")
@@ -91,14 +188,39 @@ with tab1:
 with tab2:
     st.subheader('Weight Evolution')
     st.caption('Your weight trends, food & exercise averages, and volatility over time.')
-    fig = analysis.plot()
-    st.pyplot(fig, use_container_width=True)
+    span = st.segmented_control("Range", options=list(PLOT_RANGES) + ['Custom'], default='All', key='plot_range')
+    first, last = analysis.store.dates()[0].date(), analysis.store.last_date.date()
+    start, end = None, None
+    if span == 'Custom':
+        picked = st.date_input("Dates", value=(max(first, last - datetime.timedelta(days=365)), last), min_value=first, max_value=last)
+        # While a range is being picked only its first date is set; show from there on.
+        start = picked[0] if picked else None
+        end = picked[1] if len(picked) > 1 else None
+    elif PLOT_RANGES.get(span) is not None:
+        start = max(first, last - PLOT_RANGES[span])
+    if analysis.has_entries(start, end):
+        image = analysis.plot_image(start=start, end=end)
+        with timed('app.image'):
+            st.image(image, use_container_width=True)
+    else:
+        st.info(f"No entries between {start} and {end}. Pick a range with logged days.")
 
 @st.fragment
 def forecast_tab():
+    model = st.segmented_control("Model", options=['Regression', 'ARIMA'], default='Regression', key="forecast_model")
+    mode = 'arima' if model == 'ARIMA' else 'regression'
+    # The interactive chart zooms, pans and changes unit/weeks in the browser; the image is the static fallback.
+    if st.toggle("Interactive chart", value=True, key="forecast_interactive"):
+        with st.spinner("Fitting model…"):
+            fc = analysis.forecast(mode)
+        weight_chart(analysis.store, forecast=fc, forecast_unit=analysis.measurement, forecast_key=analysis.forecast_key(mode),
+                     unit=analysis.measurement, goals=GOALS, key="weight_chart")
+        return
     weeks = st.number_input("Weeks?", min_value=1, max_value=10, value=2, step=1, key="week_input")
-    plot = analysis.forecast_graph(weeks)
-    st.pyplot(plot, use_container_width=True)
+    with st.spinner("Fitting model…"):
+        image = analysis.forecast_image(weeks, mode=mode)
+    with timed('app.image'):
+        st.image(image, use_container_width=True)
 
 with tab3:
     forecast_tab()
@@ -109,3 +231,15 @@ with tab4:
     n = st.slider("How many days?", min_value=5, max_value=100, value=20, step=5, key="last_n_slider")
     last = analysis.last_n(n=n)
     st.dataframe(last, use_container_width=True)
+
+# Per-rerun timing breakdown: opt-in panel in the sidebar, structured log line when
+# WEIGHT_TIMINGS_LOG is set. Fragment-only reruns stop before this point.
+if show_timings:
+    with timing_panel:
+        st.caption(f"This run: {instrument.rerun_total_ms():.0f} ms")
+        st.dataframe(
+            pd.DataFrame([{'step': '\u2003' * r['depth'] + r['name'], 'ms': round(r['ms'], 1)} for r in instrument.rerun_timings()]),
+            hide_index=True, use_container_width=True,
+        )
+if os.environ.get('WEIGHT_TIMINGS_LOG'):
+    instrument.log_rerun(source=SOURCE)